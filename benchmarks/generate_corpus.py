@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# Synthetic password corpus generator for the benchmarks
+# The same seed and options always produce the same file
+
+import sys
+import argparse
+import math
+import random
+
+# rough shares of password lengths and structures in public leak analyses
+LENGTH_DISTRIBUTION = {
+    4: 0.02, 5: 0.04, 6: 0.14, 7: 0.15, 8: 0.21, 9: 0.13, 10: 0.12, 11: 0.06,
+    12: 0.05, 13: 0.03, 14: 0.02, 15: 0.01, 16: 0.01, 20: 0.01
+}
+
+MASK_MIX = {
+    'word': 0.28, 'word+digits': 0.26, 'digits': 0.14, 'Word+digits': 0.09,
+    'word+digits+special': 0.06, 'keyboard': 0.04, 'leet': 0.04, 'date': 0.04,
+    'word+year': 0.03, 'random': 0.01
+}
+
+WORDS = (
+    'love', 'password', 'monkey', 'dragon', 'princess', 'sunshine', 'shadow', 'master',
+    'football', 'baseball', 'soccer', 'hockey', 'michael', 'jessica', 'ashley', 'daniel',
+    'charlie', 'jordan', 'hunter', 'summer', 'flower', 'angel', 'tigger', 'pepper',
+    'ginger', 'cookie', 'buster', 'killer', 'secret', 'letmein', 'welcome', 'hello',
+    'freedom', 'whatever', 'qwerty', 'superman', 'batman', 'trustno', 'cheese', 'purple',
+    'orange', 'banana', 'chocolate', 'butterfly', 'rainbow', 'starwars', 'liverpool', 'chelsea',
+    'maria', 'anna', 'alex', 'sam', 'max', 'baby', 'girl', 'boy', 'king', 'queen', 'star', 'blue'
+)
+
+SYLLABLES = ('ka', 'lo', 'mi', 'ra', 'te', 'no', 'sa', 'vi', 'da', 'ne', 'ro', 'li', 'ma', 'to', 'ba', 'ri')
+
+KEYBOARD_WALKS = ('qwertyuiop', 'asdfghjkl', 'zxcvbnm', '1qaz2wsx3edc', 'qazwsxedc', '1234567890', 'poiuytrewq')
+
+LEET = str.maketrans({'a': '4', 'e': '3', 'i': '1', 'o': '0', 's': '5', 't': '7'})
+
+SPECIALS = '!@#$%&*.?_-'
+
+UNICODE_LETTERS = 'éèáüöäßñçøåłżčřжзпрдлцヅあいう中文한국'
+
+def parse_distribution(text, cast=str):
+    # 'key=weight,key=weight'
+    distribution = {}
+    for item in text.split(','):
+        key, _, weight = item.partition('=')
+        distribution[cast(key.strip())] = float(weight)
+    return distribution
+
+class CorpusGenerator:
+    def __init__(self, seed=1, lengths=None, masks=None, unicode_share=0.01, duplicate_share=0.3):
+        self.rng = random.Random(seed)
+        self.lengths = lengths or LENGTH_DISTRIBUTION
+        self.masks = masks or MASK_MIX
+        unknown = set(self.masks) - set(MASK_MIX)
+        if unknown:
+            raise ValueError(f"unknown mask classes: {', '.join(sorted(unknown))}")
+        self.unicode_share = unicode_share
+        self.duplicate_share = duplicate_share
+        self.popular = []
+    
+    def _word(self, length):
+        candidates = [word for word in WORDS if len(word) == length]
+        if candidates and self.rng.random() < 0.8:
+            return self.rng.choice(candidates)
+        word = ''
+        while len(word) < length:
+            word += self.rng.choice(WORDS if self.rng.random() < 0.5 else SYLLABLES)
+        return word[:length]
+    
+    def _digits(self, length):
+        if length >= 4 and self.rng.random() < 0.3:
+            run = '1234567890' if self.rng.random() < 0.7 else '0987654321'
+            return (run * 2)[:length]
+        if self.rng.random() < 0.2:
+            return self.rng.choice('0123456789') * length
+        return ''.join(self.rng.choice('0123456789') for _ in range(length))
+    
+    def _build(self, kind, length):
+        rng = self.rng
+        if kind == 'word' or length < 3:
+            return self._word(length)
+        if kind == 'digits':
+            return self._digits(length)
+        if kind in ('word+digits', 'Word+digits'):
+            digits = min(length - 1, rng.choice((1, 1, 2, 2, 2, 3, 4)))
+            word = self._word(length - digits)
+            return (word.capitalize() if kind == 'Word+digits' else word) + self._digits(digits)
+        if kind == 'word+digits+special':
+            digits = min(length - 2, rng.choice((1, 2, 3)))
+            return self._word(length - digits - 1) + self._digits(digits) + rng.choice(SPECIALS)
+        if kind == 'word+year':
+            year = str(rng.randint(1960, 2025))
+            return self._word(max(1, length - 4)) + year if length > 4 else year[:length]
+        if kind == 'date':
+            day, month = rng.randint(1, 28), rng.randint(1, 12)
+            date = rng.choice((f"{day:02d}{month:02d}{rng.randint(1960, 2025)}", f"{month:02d}{day:02d}{rng.randint(60, 99)}"))
+            return date if length <= len(date) else self._word(length - len(date)) + date
+        if kind == 'keyboard':
+            walk = rng.choice(KEYBOARD_WALKS)
+            return walk[:length] if length <= len(walk) else walk + self._digits(length - len(walk))
+        if kind == 'leet':
+            return self._build('word+digits', length).translate(LEET)
+        return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789' + SPECIALS)
+                       for _ in range(length))
+    
+    def password(self):
+        rng = self.rng
+        if self.popular and rng.random() < self.duplicate_share:
+            # log-uniform ranks give the 1/rank (Zipf) popularity of leaked lists
+            return self.popular[int(math.exp(rng.random() * math.log(len(self.popular) + 1))) - 1]
+        
+        length = rng.choices(list(self.lengths), weights=list(self.lengths.values()))[0]
+        kind = rng.choices(list(self.masks), weights=list(self.masks.values()))[0]
+        password = self._build(kind, length)
+        if rng.random() < self.unicode_share:
+            position = rng.randrange(len(password))
+            password = password[:position] + rng.choice(UNICODE_LETTERS) + password[position + 1:]
+        if len(self.popular) < 10000:
+            self.popular.append(password)
+        return password
+    
+    def generate(self, count):
+        for _ in range(count):
+            yield self.password()
+
+def write_corpus(path, count, **options):
+    generator = CorpusGenerator(**options)
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        for password in generator.generate(count):
+            f.write(password + '\n')
+
+def write_dictionary(path):
+    with open(path, 'w', encoding='utf-8', newline='\n') as f:
+        f.write('\n'.join(WORDS) + '\n')
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a deterministic synthetic password corpus")
+    parser.add_argument("-n", "--count", type=int, default=100000, help="Number of passwords to generate")
+    parser.add_argument("-o", "--output", default='-', help="Output file ('-' writes to standard output)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed")
+    parser.add_argument("--lengths", help="Length distribution as 'length=weight,...'")
+    parser.add_argument("--masks", help=f"Mask mix as 'class=weight,...' with classes: {', '.join(MASK_MIX)}")
+    parser.add_argument("--unicode-share", type=float, default=0.01, help="Share of passwords with a non-ASCII character")
+    parser.add_argument("--duplicate-share", type=float, default=0.3, help="Share of lines that repeat an earlier password")
+    parser.add_argument("--dictionary", metavar="FILE", help="Also write the generator's word list to FILE")
+    args = parser.parse_args()
+    
+    try:
+        options = dict(
+            seed=args.seed,
+            lengths=parse_distribution(args.lengths, int) if args.lengths else None,
+            masks=parse_distribution(args.masks) if args.masks else None,
+            unicode_share=args.unicode_share,
+            duplicate_share=args.duplicate_share
+        )
+        if args.output == '-':
+            for password in CorpusGenerator(**options).generate(args.count):
+                sys.stdout.write(password + '\n')
+        else:
+            write_corpus(args.output, args.count, **options)
+    except ValueError as e:
+        parser.error(str(e))
+    
+    if args.dictionary:
+        write_dictionary(args.dictionary)
+
+if __name__ == "__main__":
+    main()
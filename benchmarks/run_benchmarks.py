@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# Times passlab.py and the analyze_*.py scripts on synthetic corpora and
+# compares throughput and peak memory with the stored baselines
+
+import sys
+import os
+import json
+import time
+import argparse
+import platform
+import tempfile
+import subprocess
+from prettytable import PrettyTable
+
+from generate_corpus import write_corpus, write_dictionary
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARK_DIR)
+BASELINES = os.path.join(BENCHMARK_DIR, 'baselines.json')
+
+class Colors:
+    GREEN = '\033[92m'
+    YELLOW = '\033[93m'
+    RED = '\033[91m'
+    BOLD = '\033[1m'
+    RESET = '\033[0m'
+
+# name -> command line after the interpreter; {corpus} and {dictionary} are filled in
+ENTRY_POINTS = {
+    'passlab-summary': ['passlab.py', '{corpus}', '--summary'],
+    'passlab-all': ['passlab.py', '{corpus}', '--all'],
+    'passlab-enhanced': ['passlab.py', '{corpus}', '--enhanced'],
+    'passlab-dictionary': ['passlab.py', '{corpus}', '--enhanced', '--dictionary', '{dictionary}'],
+    'passlab-dedup': ['passlab.py', '{corpus}', '--all', '--dedup'],
+    'analyze': ['analyze.py', '{corpus}'],
+    'analyze_1': ['analyze_1.py', '{corpus}'],
+    'analyze_general': ['analyze_general.py', '{corpus}'],
+    'analyze_next': ['analyze_next.py', '{corpus}'],
+    'analyze_next_each': ['analyze_next_each.py', '{corpus}'],
+    'analyze_type': ['analyze_type.py', '{corpus}'],
+}
+
+def run_once(command):
+    # os.wait4 reports the resource usage of this one child, so the peak RSS
+    # is not mixed up with earlier runs as RUSAGE_CHILDREN would be
+    with tempfile.TemporaryFile() as errors:
+        start = time.perf_counter()
+        process = subprocess.Popen(command, cwd=REPO_DIR, stdout=subprocess.DEVNULL, stderr=errors)
+        if hasattr(os, 'wait4'):
+            _, status, usage = os.wait4(process.pid, 0)
+            seconds = time.perf_counter() - start
+            process.returncode = os.waitstatus_to_exitcode(status)
+            # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+            max_rss_kb = usage.ru_maxrss // 1024 if sys.platform == 'darwin' else usage.ru_maxrss
+        else:
+            process.wait()
+            seconds = time.perf_counter() - start
+            max_rss_kb = None
+        errors.seek(0)
+        errors = errors.read().decode('utf-8', errors='ignore')
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(command)} failed with exit code {process.returncode}: {errors.strip()}")
+    return seconds, max_rss_kb
+
+def prepare_corpora(sizes, seed, corpus_dir):
+    os.makedirs(corpus_dir, exist_ok=True)
+    dictionary = os.path.join(corpus_dir, 'dictionary.txt')
+    write_dictionary(dictionary)
+    corpora = {}
+    for size in sizes:
+        path = os.path.join(corpus_dir, f'corpus_{size}_seed{seed}.txt')
+        if not os.path.exists(path):
+            print(f"Generating {size} passwords into {path}")
+            write_corpus(path, size, seed=seed)
+        corpora[size] = path
+    return corpora, dictionary
+
+def run_benchmarks(entries, corpora, dictionary, repeat):
+    results = {}
+    for size, corpus in corpora.items():
+        for name in entries:
+            command = [sys.executable] + [part.format(corpus=corpus, dictionary=dictionary) for part in ENTRY_POINTS[name]]
+            runs = [run_once(command) for _ in range(repeat)]
+            seconds = min(run[0] for run in runs)
+            rss = [run[1] for run in runs if run[1] is not None]
+            results[f'{name}@{size}'] = {
+                'seconds': round(seconds, 3),
+                'lines_per_second': round(size / seconds),
+                'max_rss_kb': max(rss) if rss else None
+            }
+            print(f"{name} @ {size}: {seconds:.2f}s")
+    return results
+
+def change(current, baseline):
+    if not baseline:
+        return None
+    return (current - baseline) / baseline * 100
+
+def print_comparison(results, baselines, tolerance):
+    table = PrettyTable()
+    table.field_names = ["Benchmark", "Seconds", "Lines/s", "Baseline Lines/s", "Throughput Change", "Max RSS (KB)", "Baseline RSS", "RSS Change"]
+    regressions = []
+    for key, result in results.items():
+        baseline = baselines.get(key, {})
+        speed = change(result['lines_per_second'], baseline.get('lines_per_second'))
+        memory = change(result['max_rss_kb'] or 0, baseline.get('max_rss_kb'))
+        slower = speed is not None and speed < -tolerance
+        larger = memory is not None and memory > tolerance
+        if slower or larger:
+            regressions.append(key)
+        table.add_row([
+            key, result['seconds'], result['lines_per_second'], baseline.get('lines_per_second', '-'),
+            '-' if speed is None else f"{Colors.RED if slower else ''}{speed:+.1f}%{Colors.RESET if slower else ''}",
+            result['max_rss_kb'] or '-', baseline.get('max_rss_kb', '-'),
+            '-' if memory is None else f"{Colors.RED if larger else ''}{memory:+.1f}%{Colors.RESET if larger else ''}"
+        ])
+    print(table)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the PassPatternLab tools on synthetic corpora")
+    parser.add_argument("--sizes", default="10000,100000", help="Comma-separated corpus sizes (default: 10000,100000)")
+    parser.add_argument("--entries", help=f"Comma-separated entry points (default: all): {', '.join(ENTRY_POINTS)}")
+    parser.add_argument("--seed", type=int, default=1, help="Corpus seed (baselines are recorded for seed 1)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per benchmark; the fastest run is reported")
+    parser.add_argument("--corpus-dir", default=os.path.join(BENCHMARK_DIR, 'corpus'), help="Where generated corpora are cached")
+    parser.add_argument("--baselines", default=BASELINES, help="Baseline file to compare with")
+    parser.add_argument("--tolerance", type=float, default=15.0, help="Percent slowdown or memory growth reported as a regression")
+    parser.add_argument("--update-baselines", action="store_true", help="Store these results as the new baselines")
+    parser.add_argument("--output", metavar="FILE", help="Also write the results to a JSON file")
+    args = parser.parse_args()
+    
+    entries = args.entries.split(',') if args.entries else list(ENTRY_POINTS)
+    unknown = [name for name in entries if name not in ENTRY_POINTS]
+    if unknown:
+        parser.error(f"unknown entry points: {', '.join(unknown)}")
+    sizes = [int(size) for size in args.sizes.split(',')]
+    
+    corpora, dictionary = prepare_corpora(sizes, args.seed, args.corpus_dir)
+    try:
+        results = run_benchmarks(entries, corpora, dictionary, args.repeat)
+    except RuntimeError as e:
+        print(f"{Colors.RED}Error: {e}{Colors.RESET}")
+        sys.exit(1)
+    
+    baselines = {}
+    if os.path.exists(args.baselines):
+        with open(args.baselines) as f:
+            baselines = json.load(f)['results']
+        if args.seed != 1:
+            print(f"{Colors.YELLOW}Warning: baselines were recorded for seed 1.{Colors.RESET}")
+    
+    print(f"\n{Colors.BOLD}Benchmark results:{Colors.RESET}")
+    regressions = print_comparison(results, baselines, args.tolerance)
+    
+    report = {
+        'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+        'date': time.strftime('%Y-%m-%d'),
+        'results': results
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.update_baselines:
+        if os.path.exists(args.baselines):
+            with open(args.baselines) as f:
+                stored = json.load(f)
+            stored['results'].update(results)
+            report['results'] = stored['results']
+        with open(args.baselines, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"{Colors.GREEN}Baselines updated: {args.baselines}{Colors.RESET}")
+    elif regressions:
+        print(f"{Colors.RED}Regressions beyond {args.tolerance:.0f}%: {', '.join(regressions)}{Colors.RESET}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
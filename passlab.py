@@ -9,11 +9,49 @@ import argparse
 import re
 import math
 import json
+import csv
 import itertools
-from collections import defaultdict, Counter
+import random
+import heapq
+import marshal
+import struct
+import sqlite3
+import tempfile
+import zlib
+import hashlib
+import mmap
+import gzip
+import bz2
+import lzma
+import queue
+import threading
+import signal
+import socketserver
+import http.server
+import urllib.parse
+import time
+import multiprocessing
+from abc import ABC, abstractmethod
+from array import array
+from collections import defaultdict, Counter, deque
 from datetime import datetime
 from prettytable import PrettyTable
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
 class Colors:
     GREEN = '\033[92m'
     BLUE = '\033[94m'
@@ -27,17 +65,578 @@ class Colors:
     BRIGHT_GREEN = '\033[92m'
 
 def is_ascii_printable(s):
-    return all(32 <= ord(c) <= 126 for c in s)
-
-def get_char_category(char):
-    if char in string.ascii_lowercase:
-        return 'lowercase'
-    elif char in string.ascii_uppercase:
-        return 'uppercase'
-    elif char in string.digits:
-        return 'digit'
-    else:
-        return 'special'
+    return s.isascii() and s.isprintable()
+
+READ_CHUNK_SIZE = 1 << 20
+
+def split_text_lines(data):
+    # Decoding a newline-aligned block at once equals decoding it line by
+    # line: a newline byte never occurs inside a multi-byte UTF-8 sequence.
+    # The UTF-8 decoder already copies ASCII runs at memcpy speed, so keeping
+    # ASCII lines as bytes and decoding the rest one by one was slower
+    text = str(data, 'utf-8', 'ignore')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    return lines
+
+def iter_stream_lines(stream, limit=None, chunk_size=READ_CHUNK_SIZE):
+    # Same lines as text-mode iteration (utf-8, errors='ignore', universal
+    # newlines) but read in large binary chunks and split in C
+    pending = b''
+    while limit is None or limit > 0:
+        chunk = stream.read(chunk_size if limit is None else min(chunk_size, limit))
+        if not chunk:
+            break
+        if limit is not None:
+            limit -= len(chunk)
+        data = pending + chunk
+        cut = data.rfind(b'\n') + 1
+        if cut == 0 and len(data) > 16 * chunk_size:
+            # files that only use '\r' line endings; never cut after a trailing
+            # '\r' since it may be the first half of '\r\n'
+            cut = data.rfind(b'\r', 0, len(data) - 1) + 1
+        if cut == 0:
+            pending = data
+            continue
+        pending = data[cut:]
+        yield from split_text_lines(data[:cut])
+    if pending:
+        yield from split_text_lines(pending)
+
+class MappedLineReader:
+    # Maps a plain file and splits it into newline-aligned blocks found with
+    # mmap.find/rfind; each block is a memoryview into the mapping that is
+    # decoded in one call, so no bytes are copied or concatenated. Workers
+    # that map the same file share its pages in the OS cache.
+    def __init__(self, file):
+        self.size = os.fstat(file.fileno()).st_size
+        self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if hasattr(self.map, 'madvise'):
+            self.map.madvise(mmap.MADV_SEQUENTIAL)
+        self.view = memoryview(self.map)
+    
+    @classmethod
+    def open(cls, file):
+        try:
+            return cls(file)
+        except (OSError, ValueError):
+            # empty files, pipes and other special files cannot be mapped
+            return None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def close(self):
+        self.view.release()
+        self.map.close()
+    
+    def _cut(self, start, stop, end, chunk_size):
+        found = self.map.rfind(b'\n', start, stop) + 1
+        if not found:
+            found = self.map.find(b'\n', stop, min(end, start + 16 * chunk_size)) + 1
+        if not found:
+            # files that only use '\r' line endings, as in iter_stream_lines
+            found = self.map.rfind(b'\r', start, stop - 1) + 1
+        if not found:
+            found = self.map.find(b'\n', stop, end) + 1
+        return found or end
+    
+    def blocks(self, start=0, end=None, chunk_size=READ_CHUNK_SIZE):
+        end = self.size if end is None else end
+        while start < end:
+            stop = start + chunk_size
+            cut = end if stop >= end else self._cut(start, stop, end, chunk_size)
+            yield self.view[start:cut]
+            start = cut
+    
+    def lines(self, start=0, end=None):
+        for block in self.blocks(start, end):
+            with block:
+                lines = split_text_lines(block)
+            yield from lines
+    
+    def ranges(self, parts):
+        boundaries = [0]
+        for i in range(1, parts):
+            offset = self.size * i // parts
+            if offset <= boundaries[-1]:
+                continue
+            offset = self.map.find(b'\n', offset - 1) + 1
+            if not offset or offset >= self.size:
+                break
+            if offset > boundaries[-1]:
+                boundaries.append(offset)
+        boundaries.append(self.size)
+        return [(start, end) for start, end in zip(boundaries, boundaries[1:]) if end > start]
+
+COMPRESSION_MAGIC = (
+    (b'\x1f\x8b', 'gzip'),
+    (b'BZh', 'bz2'),
+    (b'\xfd7zXZ\x00', 'xz'),
+    (b'\x28\xb5\x2f\xfd', 'zstd'),
+)
+
+DECOMPRESS_THREADS = min(4, os.cpu_count() or 1)
+
+def detect_compression(header):
+    for magic, kind in COMPRESSION_MAGIC:
+        if header.startswith(magic):
+            return kind
+    return None
+
+def decompressing_stream(file, kind):
+    if kind == 'gzip':
+        return gzip.GzipFile(fileobj=file, mode='rb')
+    if kind == 'bz2':
+        return bz2.BZ2File(file)
+    if kind == 'xz':
+        return lzma.LZMAFile(file)
+    return zstandard.ZstdDecompressor().stream_reader(file, read_across_frames=True)
+
+def frame_decoder(kind):
+    if kind == 'gzip':
+        return zlib.decompressobj(31)
+    return zstandard.ZstdDecompressor().decompressobj()
+
+def _zstd_frame_size(file, offset):
+    header = file.read(8)
+    magic = int.from_bytes(header[:4], 'little')
+    if magic & 0xFFFFFFF0 == 0x184D2A50:
+        return 8 + int.from_bytes(header[4:8], 'little')
+    if magic != 0xFD2FB528 or len(header) < 5:
+        raise ValueError("not a zstd frame")
+    descriptor = header[4]
+    single_segment = descriptor & 0x20
+    position = (5 + (0 if single_segment else 1) + (0, 1, 2, 4)[descriptor & 3]
+                + ((0, 2, 4, 8)[descriptor >> 6] or (1 if single_segment else 0)))
+    while True:
+        file.seek(offset + position)
+        block = file.read(3)
+        if len(block) < 3:
+            raise ValueError("truncated zstd frame")
+        value = int.from_bytes(block, 'little')
+        position += 3 + (1 if (value >> 1) & 3 == 1 else value >> 3)
+        if value & 1:
+            return position + (4 if descriptor & 4 else 0)
+
+def _bgzf_block_size(file):
+    header = file.read(12)
+    if len(header) < 12 or header[:2] != b'\x1f\x8b' or not header[3] & 4:
+        raise ValueError("not a BGZF block")
+    extra = file.read(int.from_bytes(header[10:12], 'little'))
+    i = 0
+    while i + 4 <= len(extra):
+        length = int.from_bytes(extra[i + 2:i + 4], 'little')
+        if extra[i:i + 2] == b'BC' and length == 2:
+            return int.from_bytes(extra[i + 4:i + 6], 'little') + 1
+        i += 4 + length
+    raise ValueError("not a BGZF block")
+
+def iter_frames(file, kind, offset=0):
+    # Independent frames found from their headers alone: BGZF blocks store
+    # their compressed size and zstd frames are walked block by block, so
+    # nothing is decompressed to find the boundaries
+    size = os.fstat(file.fileno()).st_size
+    while offset < size:
+        file.seek(offset)
+        frame_size = _bgzf_block_size(file) if kind == 'gzip' else _zstd_frame_size(file, offset)
+        yield offset, frame_size
+        offset += frame_size
+
+def is_multi_frame(file, kind):
+    if kind not in ('gzip', 'zstd'):
+        return False
+    try:
+        frames = iter_frames(file, kind)
+        next(frames)
+        next(frames)
+        return True
+    except (ValueError, StopIteration):
+        return False
+    finally:
+        file.seek(0)
+
+def frame_units(file, kind, unit_size):
+    start = end = 0
+    for offset, frame_size in iter_frames(file, kind):
+        end = offset + frame_size
+        if end - start >= unit_size:
+            yield start, end
+            start = end
+    if end > start:
+        yield start, end
+
+def decode_frames(file_path, kind, offset, size, chunk_size=READ_CHUNK_SIZE):
+    decoder = None
+    with open(file_path, 'rb') as file:
+        file.seek(offset)
+        while size > 0:
+            data = file.read(min(chunk_size, size))
+            if not data:
+                break
+            size -= len(data)
+            while data:
+                if decoder is None:
+                    decoder = frame_decoder(kind)
+                output = decoder.decompress(data)
+                if output:
+                    yield output
+                data = b''
+                if decoder.eof:
+                    data = decoder.unused_data
+                    decoder = None
+    if decoder is not None:
+        raise EOFError("compressed file ended before the end-of-stream marker was reached")
+
+class PrefetchReader:
+    # Decompresses on a background thread; zlib, bz2, lzma and zstd release
+    # the GIL, so decoding the next chunks overlaps with counting this one
+    def __init__(self, stream, chunk_size=READ_CHUNK_SIZE, depth=8):
+        self.chunks = queue.Queue(depth)
+        self.done = False
+        threading.Thread(target=self._fill, args=(stream, chunk_size), daemon=True).start()
+    
+    def _fill(self, stream, chunk_size):
+        try:
+            while True:
+                chunk = stream.read(chunk_size)
+                self.chunks.put(chunk)
+                if not chunk:
+                    return
+        except Exception as e:
+            self.chunks.put(e)
+    
+    def read(self, size=-1):
+        if self.done:
+            return b''
+        chunk = self.chunks.get()
+        if isinstance(chunk, Exception):
+            self.done = True
+            raise chunk
+        self.done = not chunk
+        return chunk
+
+class ParallelFrameReader:
+    # Decodes several groups of independent frames at once, one thread per
+    # group; each group fills its own bounded queue and groups are read
+    # back in file order, so output order and memory use stay fixed
+    def __init__(self, file_path, kind, threads, unit_size=4 * READ_CHUNK_SIZE):
+        self.file_path = file_path
+        self.kind = kind
+        self.threads = threads
+        self.index = open(file_path, 'rb')
+        self.units = frame_units(self.index, kind, unit_size)
+        self.pending = deque()
+    
+    def _decode(self, offset, size, chunks):
+        try:
+            buffered = []
+            buffered_size = 0
+            for output in decode_frames(self.file_path, self.kind, offset, size):
+                buffered.append(output)
+                buffered_size += len(output)
+                if buffered_size >= READ_CHUNK_SIZE:
+                    chunks.put(b''.join(buffered))
+                    buffered = []
+                    buffered_size = 0
+            if buffered:
+                chunks.put(b''.join(buffered))
+            chunks.put(None)
+        except Exception as e:
+            chunks.put(e)
+    
+    def read(self, size=-1):
+        while True:
+            while self.units is not None and len(self.pending) < self.threads:
+                unit = next(self.units, None)
+                if unit is None:
+                    self.units = None
+                    self.index.close()
+                    break
+                chunks = queue.Queue(4)
+                threading.Thread(target=self._decode, args=(unit[0], unit[1] - unit[0], chunks), daemon=True).start()
+                self.pending.append(chunks)
+            if not self.pending:
+                return b''
+            chunk = self.pending[0].get()
+            if isinstance(chunk, Exception):
+                raise chunk
+            if chunk is None:
+                self.pending.popleft()
+                continue
+            return chunk
+
+def open_input_stream(file, file_path=None):
+    kind = detect_compression(file.peek(8)[:8])
+    if kind is None:
+        return file
+    if kind == 'zstd' and zstandard is None:
+        raise RuntimeError("reading zstd input requires the zstandard package (pip install zstandard)")
+    if file_path and DECOMPRESS_THREADS > 1 and is_multi_frame(file, kind):
+        return ParallelFrameReader(file_path, kind, DECOMPRESS_THREADS)
+    return PrefetchReader(decompressing_stream(file, kind))
+
+def split_input_ranges(file_path, parts):
+    # Newline-aligned byte ranges for plain files, frame-aligned ranges for
+    # BGZF and multi-frame zstd; None when the input cannot be split
+    if file_path == '-':
+        return None
+    with open(file_path, 'rb') as file:
+        kind = detect_compression(file.peek(8)[:8])
+        if kind is None:
+            return split_file_ranges(file_path, parts)
+        if (kind == 'zstd' and zstandard is None) or not is_multi_frame(file, kind):
+            return None
+        unit_size = max(1, os.fstat(file.fileno()).st_size // parts)
+        return [(start, end, kind) for start, end in frame_units(file, kind, unit_size)]
+
+def iter_frame_lines(file_path, kind, start, end):
+    # A range owns the lines that start after the first newline at or after
+    # its start; the last line is finished from the frames past its end
+    pending = b''
+    skipping = start > 0
+    for chunk in decode_frames(file_path, kind, start, end - start):
+        if skipping:
+            cut = chunk.find(b'\n')
+            if cut < 0:
+                continue
+            chunk = chunk[cut + 1:]
+            skipping = False
+        data = pending + chunk
+        cut = data.rfind(b'\n') + 1
+        pending = data[cut:]
+        yield from split_text_lines(data[:cut])
+    if skipping:
+        return
+    size = os.path.getsize(file_path)
+    if end < size:
+        for chunk in decode_frames(file_path, kind, end, size - end):
+            cut = chunk.find(b'\n')
+            if cut >= 0:
+                pending += chunk[:cut + 1]
+                break
+            pending += chunk
+    if pending:
+        yield from split_text_lines(pending)
+
+def iter_file_lines(file_path, start=0, end=None, compression=None):
+    if compression:
+        yield from iter_frame_lines(file_path, compression, start, end)
+        return
+    if file_path == '-':
+        yield from iter_stream_lines(open_input_stream(sys.stdin.buffer))
+        return
+    with open(file_path, 'rb') as file:
+        if not (start or end is not None) and detect_compression(file.peek(8)[:8]):
+            yield from iter_stream_lines(open_input_stream(file, file_path))
+            return
+        reader = MappedLineReader.open(file)
+        if reader is None:
+            file.seek(start)
+            yield from iter_stream_lines(file, None if end is None else end - start)
+            return
+        with reader:
+            yield from reader.lines(start, end)
+
+SAMPLE_METHODS = ('seek', 'reservoir', 'stratified')
+
+# random offsets tried per requested line before seek sampling gives up on
+# a file that is too small for the sample
+SEEK_ATTEMPTS = 64
+STRATUM_SLACK = 16
+
+def seek_sample_lines(file_path, size, rng):
+    # Takes the line containing each random byte offset and keeps it with
+    # probability 1 / (its bytes including the newline), so every line is
+    # equally likely whatever its length; lines are drawn without
+    # replacement and only the sampled ones are read. Returns None for input
+    # that cannot be mapped or has fewer lines than the sample can find
+    if file_path == '-':
+        return None
+    with open(file_path, 'rb') as file:
+        if detect_compression(file.peek(8)[:8]):
+            return None
+        reader = MappedLineReader.open(file)
+        if reader is None:
+            return None
+        with reader:
+            data = reader.map
+            picked = {}
+            for _ in range(SEEK_ATTEMPTS * size):
+                if len(picked) == size:
+                    break
+                offset = rng.randrange(reader.size)
+                start = data.rfind(b'\n', 0, offset) + 1
+                end = data.find(b'\n', offset)
+                stop = end if end >= 0 else reader.size
+                if start in picked or rng.random() * (stop - start + (end >= 0)) >= 1:
+                    continue
+                picked[start] = str(data[start:stop], 'utf-8', 'ignore')
+            if len(picked) < size:
+                return None
+    return [picked[start] for start in sorted(picked)]
+
+def reservoir_sample(lines, size, rng):
+    # Algorithm L: once the reservoir is full the gap to the next replacement
+    # is drawn directly, so skipped lines only cost the iteration
+    lines = iter(lines)
+    reservoir = list(itertools.islice(lines, size))
+    if len(reservoir) < size:
+        return reservoir
+    weight = math.exp(math.log(1.0 - rng.random()) / size)
+    while weight < 1.0:
+        skip = int(math.log(1.0 - rng.random()) / math.log(1.0 - weight))
+        line = next(itertools.islice(lines, skip, None), None)
+        if line is None:
+            break
+        reservoir[rng.randrange(size)] = line
+        weight *= math.exp(math.log(1.0 - rng.random()) / size)
+    return reservoir
+
+def stratified_sample(lines, size, rng, key=len):
+    # Every line gets a random rank and each stratum (key(line), the
+    # password length) keeps its lowest-ranked lines, capped at its running
+    # share of the sample plus some slack, so memory stays near `size`. At
+    # the end the strata get largest-remainder shares adding up to `size`
+    strata = {}
+    population = 0
+    for line in lines:
+        population += 1
+        stratum = strata.setdefault(key(line), [0, []])
+        stratum[0] += 1
+        cap = math.ceil(size * stratum[0] / population) + STRATUM_SLACK
+        heap = stratum[1]
+        # max-heap on the rank through negation
+        rank = -rng.random()
+        if len(heap) < cap:
+            heapq.heappush(heap, (rank, line))
+        elif rank > heap[0][0]:
+            heapq.heapreplace(heap, (rank, line))
+        while len(heap) > cap:
+            heapq.heappop(heap)
+    if population <= size:
+        return [line for length in sorted(strata) for _, line in strata[length][1]]
+    
+    quotas = {length: size * seen / population for length, (seen, _) in strata.items()}
+    shares = {length: min(int(quota), len(strata[length][1])) for length, quota in quotas.items()}
+    # hand out the rest by largest remainder, skipping strata that ran dry
+    for length in sorted(quotas, key=lambda length: (shares[length] - quotas[length], length)):
+        if sum(shares.values()) == size:
+            break
+        if shares[length] < len(strata[length][1]):
+            shares[length] += 1
+    sample = []
+    for length in sorted(strata):
+        ranked = sorted(strata[length][1], reverse=True)
+        sample.extend(line for _, line in ranked[:shares[length]])
+    return sample
+
+def wilson_interval(count, total, z=1.96):
+    if total <= 0:
+        return 0.0, 0.0
+    p = count / total
+    denominator = 1 + z * z / total
+    centre = (p + z * z / (2 * total)) / denominator
+    margin = z * math.sqrt(p * (1 - p) / total + z * z / (4 * total * total)) / denominator
+    return max(0.0, centre - margin), min(1.0, centre + margin)
+
+INPUT_FORMATS = ('plain', 'uniq-c', 'counted', 'potfile')
+
+HEX_PLAIN = re.compile(r'\$HEX\[([0-9a-fA-F]*)\]')
+
+def decode_hex_plain(plain):
+    match = HEX_PLAIN.fullmatch(plain)
+    if match and len(match.group(1)) % 2 == 0:
+        return bytes.fromhex(match.group(1)).decode('utf-8', errors='ignore')
+    return plain
+
+def iter_weighted_records(lines, input_format):
+    # Yields (password, weight) pairs; weight 0 marks a line that does not
+    # parse. uniq-c is 'uniq -c' output, counted is 'count:password' and
+    # potfile is 'hash:plain', split at the last ':' as hashcat writes plains
+    # containing ':' in $HEX[] form
+    if input_format == 'potfile':
+        for line in lines:
+            _, separator, plain = line.rpartition(':')
+            yield (decode_hex_plain(plain), 1) if separator else (line, 0)
+        return
+    for line in lines:
+        if input_format == 'uniq-c':
+            count, _, password = line.lstrip().partition(' ')
+        else:
+            count, _, password = line.partition(':')
+        count = count.strip()
+        yield (password, int(count)) if count.isdecimal() else (line, 0)
+
+# rough cost of one Counter entry holding a short password, used to turn the
+# dedup memory budget into a number of distinct keys
+DEDUP_ENTRY_BYTES = 120
+DEDUP_PARTITIONS = 64
+DEDUP_BATCH_SIZE = 50000
+
+def dedup_records(records, memory_mb, temp_dir=None):
+    # Collapses (password, weight) records into one record per unique
+    # password. Counts stay in memory until the budget is reached; from then
+    # on partial counts are spilled to hash partitions on disk, so every
+    # partition can be collapsed on its own afterwards. Without a spill the
+    # records come out in first-seen order
+    limit = max(10000, memory_mb * 2**20 // DEDUP_ENTRY_BYTES)
+    counts = Counter()
+    with tempfile.TemporaryDirectory(prefix='passlab-dedup-', dir=temp_dir) as directory:
+        partitions = None
+        for password, weight in records:
+            counts[password] += weight
+            if len(counts) >= limit:
+                if partitions is None:
+                    partitions = [open(os.path.join(directory, f'part{i:02d}'), 'wb') for i in range(DEDUP_PARTITIONS)]
+                _spill_partitions(counts, partitions)
+                counts = Counter()
+        
+        if partitions is None:
+            yield from counts.items()
+            return
+        
+        _spill_partitions(counts, partitions)
+        del counts
+        for partition in partitions:
+            partition.close()
+            counts = Counter()
+            with open(partition.name, 'rb') as f:
+                while True:
+                    try:
+                        chunk = marshal.load(f)
+                    except EOFError:
+                        break
+                    for password, weight in chunk:
+                        counts[password] += weight
+            os.remove(partition.name)
+            yield from counts.items()
+
+def _spill_partitions(counts, partitions):
+    chunks = [[] for _ in partitions]
+    for item in counts.items():
+        chunks[hash(item[0]) % len(partitions)].append(item)
+    for partition, chunk in zip(partitions, chunks):
+        marshal.dump(chunk, partition)
+
+# l/L/d for ASCII letters and digits, s for everything else; non-ASCII
+# characters are encoded as '?' first, which also maps to s
+PATTERN_TABLE = bytes(
+    ord('l') if chr(c) in string.ascii_lowercase else
+    ord('L') if chr(c) in string.ascii_uppercase else
+    ord('d') if chr(c) in string.digits else ord('s')
+    for c in range(256)
+)
+MASK_CATEGORIES = {'l': 'lowercase', 'L': 'uppercase', 'd': 'digit', 's': 'special'}
+
+def password_mask(password):
+    return password.encode('ascii', errors='replace').translate(PATTERN_TABLE).decode('ascii')
 
 def pattern_to_regex(pattern):
     translation = {
@@ -56,35 +655,174 @@ def pattern_to_regex(pattern):
     return regex_pattern
 
 def get_entropy(password):
-    char_sets = {
-        'lowercase': 26,
-        'uppercase': 26,
-        'digit': 10, 
-        'special': 33
-    }
+    return entropy_from_mask(password_mask(password))
+
+def entropy_from_mask(mask):
+    char_space = 26 * ('l' in mask) + 26 * ('L' in mask) + 10 * ('d' in mask) + 33 * ('s' in mask)
+    return len(mask) * (char_space.bit_length() - 1)
+
+KEYBOARD_LAYOUTS = {
+    'QWERTY': {
+        'rows': ['1234567890-=', 'qwertyuiop[]\\', "asdfghjkl;'", 'zxcvbnm,./'],
+        'shift_rows': ['!@#$%^&*()_+', 'QWERTYUIOP{}|', 'ASDFGHJKL:"', 'ZXCVBNM<>?'],
+    },
+    'AZERTY': {
+        'rows': ['&é"\'(-è_çà)=', 'azertyuiop^$', 'qsdfghjklmù*', '<wxcvbn,;:!'],
+        'shift_rows': ['1234567890°+', 'AZERTYUIOP¨£', 'QSDFGHJKLM%µ', '>WXCVBN?./§'],
+        'offsets': [0, 0.5, 0.75, 0.25],
+    },
+    'Numeric': {
+        'rows': ['789', '456', '123', '0.'],
+        'offsets': [0, 0, 0, 0],
+        'reach': 1,
+    },
+}
+
+class KeyboardWalkDetector:
+    # Each layout is a grid of keys; rows are shifted by 'offsets' (in key
+    # widths) and keys on neighbouring rows are adjacent when their centres
+    # are at most 'reach' apart. Adjacency for all layouts is folded into one
+    # table of layout bitmasks so a password is scanned once for every layout.
+    def __init__(self, layouts=None, min_walk=4):
+        self.layouts = dict(layouts or KEYBOARD_LAYOUTS)
+        self.layout_names = list(self.layouts)
+        self.min_walk = min_walk
+        self.adjacency = defaultdict(dict)
+        # char -> {layout bit: (row, x)}, for comparing stroke directions
+        self.positions = defaultdict(dict)
+        for bit, name in enumerate(self.layout_names):
+            self._add_layout(1 << bit, self.layouts[name])
+        self.adjacency = dict(self.adjacency)
+        self.positions = dict(self.positions)
+        self.all_layouts = (1 << len(self.layout_names)) - 1
     
-    char_categories = set(get_char_category(c) for c in password)
-    char_space = sum(char_sets[category] for category in char_categories)
-    
-    return len(password) * (char_space.bit_length() - 1)
-
-def detect_keyboard_pattern(password, keyboard_layouts):
-    for layout_name, layout in keyboard_layouts.items():
-        for row in layout:
-            window_size = min(len(password), len(row))
-            for i in range(len(row) - window_size + 1):
-                window = row[i:i+window_size]
-                if window.lower() in password.lower():
-                    return (layout_name, window)
-                if window.lower()[::-1] in password.lower():
-                    return (layout_name, window[::-1])
-    return None
+    def _add_layout(self, mask, spec):
+        rows = spec['rows']
+        shift_rows = spec.get('shift_rows', [])
+        offsets = spec.get('offsets', [0, 0.5, 0.75, 1.25])
+        reach = spec.get('reach', 0.75)
+        
+        keys = []
+        for row_index, row in enumerate(rows):
+            shifted = shift_rows[row_index] if row_index < len(shift_rows) else ''
+            offset = offsets[row_index] if row_index < len(offsets) else 0
+            for col, char in enumerate(row):
+                variants = {char, char.upper()}
+                if col < len(shifted):
+                    variants.add(shifted[col])
+                keys.append((row_index, col + offset, variants))
+                for variant in variants:
+                    self.positions[variant].setdefault(mask, (row_index, col + offset))
+        
+        for row_a, x_a, chars_a in keys:
+            for row_b, x_b, chars_b in keys:
+                if row_a == row_b:
+                    adjacent = abs(x_a - x_b) == 1
+                else:
+                    adjacent = abs(row_a - row_b) == 1 and abs(x_a - x_b) <= reach
+                if not adjacent:
+                    continue
+                for a in chars_a:
+                    for b in chars_b:
+                        self.adjacency[a][b] = self.adjacency[a].get(b, 0) | mask
+    
+    def _same_direction(self, a, b, c, d, mask):
+        # layouts of mask in which c -> d is the same key offset as a -> b
+        positions = (self.positions.get(a), self.positions.get(b), self.positions.get(c), self.positions.get(d))
+        if not all(positions):
+            return 0
+        same = 0
+        while mask:
+            bit = mask & -mask
+            mask ^= bit
+            pa, pb, pc, pd = (position.get(bit) for position in positions)
+            if pa and pb and pc and pd and pb[0] - pa[0] == pd[0] - pc[0] and round(pb[1] - pa[1] - pd[1] + pc[1], 6) == 0:
+                same |= bit
+        return same
+    
+    def _walk(self, password, start):
+        # Follows one walk from start and returns (end, layout mask, where the
+        # next walk may start). A stroke continues while each key is adjacent
+        # to the previous one (diagonals and row changes included, so reversed
+        # walks match too) and no key of the walk is pressed twice. After a
+        # stroke of at least min_walk keys the walk may jump to a key adjacent
+        # to the stroke's first key and repeat that stroke offset for offset,
+        # as in 1qaz2wsx; the repeat only counts once it is complete
+        adjacency = self.adjacency
+        length = len(password)
+        mask = confirmed_mask = self.all_layouts
+        seen = {password[start]}
+        stroke_start = start
+        previous = None
+        confirmed = i = start + 1
+        while i < length:
+            char = password[i]
+            if char in seen:
+                break
+            stroke = i - stroke_start
+            step = 0
+            if previous is None:
+                neighbours = adjacency.get(password[i - 1])
+                step = neighbours.get(char, 0) & mask if neighbours else 0
+            elif stroke < previous[1]:
+                begin = previous[0] + stroke
+                step = self._same_direction(password[begin - 1], password[begin], password[i - 1], char, mask)
+            if step:
+                mask = step
+                seen.add(char)
+                i += 1
+                if previous is None or i - stroke_start == previous[1]:
+                    confirmed, confirmed_mask = i, mask
+                continue
+            if stroke >= self.min_walk if previous is None else stroke == previous[1]:
+                neighbours = adjacency.get(password[stroke_start])
+                jump = neighbours.get(char, 0) & mask if neighbours else 0
+                if jump:
+                    previous = (stroke_start, stroke)
+                    stroke_start = i
+                    mask = jump
+                    seen.add(char)
+                    i += 1
+                    continue
+            break
+        if confirmed < i:
+            # an unfinished repeat may still begin a walk of its own
+            return confirmed, confirmed_mask, stroke_start
+        return confirmed, confirmed_mask, max(start + 1, confirmed - 1)
+    
+    def find(self, password):
+        # Longest walk; each walk resumes at most one key before the end of
+        # the last one, so the scan stays linear apart from abandoned repeats
+        length = len(password)
+        if length < self.min_walk:
+            return None
+        best_start = best_end = 0
+        best_mask = 0
+        start = 0
+        while start < length - 1:
+            end, mask, resume = self._walk(password, start)
+            if end - start > best_end - best_start:
+                best_start, best_end, best_mask = start, end, mask
+            start = resume
+        
+        if best_end - best_start < self.min_walk:
+            return None
+        layout = self.layout_names[(best_mask & -best_mask).bit_length() - 1]
+        return (layout, password[best_start:best_end].lower())
+
+def load_keyboard_layouts(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        layouts = json.load(f)
+    for name, spec in layouts.items():
+        if not isinstance(spec, dict) or not spec.get('rows'):
+            raise ValueError(f"layout '{name}' needs a 'rows' list")
+    return layouts
 
 def detect_numerical_sequence(s):
     if len(s) < 3:
         return False
     
-    if all(c.isdigit() for c in s):
+    if all(c.isdecimal() for c in s):
         digits = [int(c) for c in s]
         if all(digits[i] == digits[i-1] + 1 for i in range(1, len(digits))):
             return True
@@ -93,51 +831,110 @@ def detect_numerical_sequence(s):
     
     return False
 
-def detect_date_patterns(s):
-    date_patterns = [
-        r'\b(19|20)\d{2}[01]\d[0-3]\d\b',
-        r'\b[0-3]\d[01]\d(19|20)\d{2}\b',
-        r'\b[01]\d[0-3]\d(19|20)\d{2}\b',
-        r'\b(19|20)\d{2}[01]\d\b',
-        r'\b[01]\d(19|20)\d{2}\b',
-        r'\b[01]\d[0-3]\d\d{2}\b'
-    ]
-    
-    for pattern in date_patterns:
-        if re.search(pattern, s):
-            return True
-    return False
+DATE_PATTERNS = [
+    r'\b(19|20)\d{2}[01]\d[0-3]\d\b',
+    r'\b[0-3]\d[01]\d(19|20)\d{2}\b',
+    r'\b[01]\d[0-3]\d(19|20)\d{2}\b',
+    r'\b(19|20)\d{2}[01]\d\b',
+    r'\b[01]\d(19|20)\d{2}\b',
+    r'\b[01]\d[0-3]\d\d{2}\b'
+]
+DATE_MATCHER = re.compile('|'.join(f'(?:{pattern})' for pattern in DATE_PATTERNS))
 
-def is_leetspeak(word):
-    leet_map = {
-        '4': 'a', '@': 'a', '8': 'b', '(': 'c', '3': 'e', 
-        '6': 'g', '9': 'g', '1': 'i', '!': 'i', '0': 'o',
-        '5': 's', '$': 's', '7': 't', '+': 't', '2': 'z'
-    }
+LEET_MAP = {
+    '4': 'a', '@': 'a', '8': 'b', '(': 'c', '3': 'e', 
+    '6': 'g', '9': 'g', '1': 'i', '!': 'i', '0': 'o',
+    '5': 's', '$': 's', '7': 't', '+': 't', '2': 'z'
+}
+LEET_CHARS = frozenset(LEET_MAP)
+
+SPECIAL_CHARS = frozenset('!@#$%^&*()-_=+[]{};:\'",.<>/?\\|~`')
+REPEAT_RUN = re.compile(r'(.)\1{2,}', re.DOTALL)
+NUMERIC_TRIPLE = re.compile('|'.join(
+    ['012', '123', '234', '345', '456', '567', '678', '789',
+     '987', '876', '765', '654', '543', '432', '321', '210']))
+ALPHA_DIGIT_SPLIT = re.compile(r'^([a-zA-Z]+)([0-9]+)$')
+# l/L/d for ASCII letters and digits, s for the special set, o for space and controls
+FEATURE_MASK = str.maketrans(
+    string.ascii_lowercase + string.ascii_uppercase + string.digits + string.punctuation
+    + ''.join(chr(c) for c in range(128) if chr(c) not in string.printable or chr(c) in string.whitespace),
+    'l' * 26 + 'L' * 26 + 'd' * 10 + 's' * len(string.punctuation)
+    + 'o' * (128 - 94)
+)
+
+def scan_enhanced_features(password):
+    # One classification of the password (a C-level translate for ASCII)
+    # feeds every cheap enhanced detector; the remaining checks are
+    # precompiled scans or substring tests on the class mask. Non-ASCII
+    # passwords keep the Unicode-aware checks so results are unchanged.
+    runs = [(match.group(1), len(match.group())) for match in REPEAT_RUN.finditer(password)] if len(password) > 2 else []
+    leet = not LEET_CHARS.isdisjoint(password)
     
-    if any(c in leet_map for c in word):
-        return True
-    return False
+    if password.isascii():
+        mask = password.translate(FEATURE_MASK)
+        numeric = 'ddd' in mask and NUMERIC_TRIPLE.search(password) is not None
+        date = 'dddddd' in mask and DATE_MATCHER.search(password) is not None
+        suffix = None
+        if mask[-1:] == 'd':
+            split = ALPHA_DIGIT_SPLIT.match(password)
+            if split:
+                suffix = split.group(2)
+        
+        special_positions = []
+        position = mask.find('s')
+        while position != -1:
+            special_positions.append(position)
+            position = mask.find('s', position + 1)
+        
+        capitalization = None
+        if 'L' in mask and 'l' in mask:
+            if mask[0] == 'L' and 'L' not in mask[1:]:
+                capitalization = 'First letter'
+            elif mask[0] == 'l' and 'lL' in mask:
+                capitalization = 'camelCase'
+            else:
+                capitalization = 'Random'
+        return runs, numeric, date, leet, suffix, special_positions, capitalization
+    
+    numeric = any(detect_numerical_sequence(password[i:i+3]) for i in range(len(password) - 2))
+    date = DATE_MATCHER.search(password) is not None
+    split = ALPHA_DIGIT_SPLIT.match(password)
+    suffix = split.group(2) if split else None
+    special_positions = [i for i, char in enumerate(password) if char in SPECIAL_CHARS]
+    
+    capitalization = None
+    if any(c.isupper() for c in password) and any(c.islower() for c in password):
+        if password[0].isupper() and all(c.islower() for c in password[1:] if c.isalpha()):
+            capitalization = 'First letter'
+        elif all(c.isupper() for c in password if c.isalpha()):
+            capitalization = 'ALL CAPS'
+        elif password[0].islower() and any(password[i].isupper() and password[i-1].islower() for i in range(1, len(password))):
+            capitalization = 'camelCase'
+        else:
+            capitalization = 'Random'
+    return runs, numeric, date, leet, suffix, special_positions, capitalization
 
 def analyzePasswordsFromFile(file_path, max_length=20):
+    return run_plugins(file_path, [CharacterTypePlugin(max_length)])[0].tables()
+
+def classicTablesFromCounts(charCountsByPosition, max_length=20):
     positionCounters = defaultdict(lambda: Counter({'lower': 0, 'upper': 0, 'number': 0, 'special': 0}))
     charCounters = defaultdict(Counter)
     specialCharacters = set('!@#$%^&*()-_=+[]{};:\'",.<>/?\\|~`')
+    maskTypes = {'l': 'lower', 'L': 'upper', 'd': 'number'}
     
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-        for password in file:
-            password = password.strip()[:max_length]
-            for i, char in enumerate(password):
-                if char in string.ascii_lowercase:
-                    positionCounters[i]['lower'] += 1
-                elif char in string.ascii_uppercase:
-                    positionCounters[i]['upper'] += 1
-                elif char in string.digits:
-                    positionCounters[i]['number'] += 1
-                if char in specialCharacters:
-                    positionCounters[i]['special'] += 1
-                if char.isalnum() or char in specialCharacters:
-                    charCounters[i][char] += 1
+    for i, counter in charCountsByPosition.items():
+        if i >= max_length:
+            continue
+        for char, count in counter.items():
+            kind = password_mask(char)
+            if kind != 's':
+                positionCounters[i][maskTypes[kind]] += count
+            elif char in specialCharacters:
+                positionCounters[i]['special'] += count
+            elif not char.isalnum():
+                continue
+            charCounters[i][char] += count
     
     for i in range(max_length):
         total_chars = sum(positionCounters[i].values())
@@ -147,7 +944,7 @@ def analyzePasswordsFromFile(file_path, max_length=20):
     
     return positionCounters, charCounters
 
-def printAnalysisResults(typeAnalysisResult, charAnalysisResult, max_length=20):
+def printAnalysisResults(typeAnalysisResult, charAnalysisResult, max_length=20, specialsInLeastCommon=True):
     specialCharacters = set('!@#$%^&*()-_=+[]{};:\'",.<>/?\\|~`')
     bright_green = '\033[92m'
     reset = '\033[0m'
@@ -171,7 +968,7 @@ def printAnalysisResults(typeAnalysisResult, charAnalysisResult, max_length=20):
         most_common_chars = ' '.join([char for char, count in charAnalysisResult[i].most_common(5)])
         
         least_common_chars = ' '.join([char for char, count in sorted(charAnalysisResult[i].items(), key=lambda item: item[1]) 
-                                      if char.isalnum() or char in specialCharacters][:5])
+                                      if char.isalnum() or (specialsInLeastCommon and char in specialCharacters)][:5])
         
         least_used_letters = ' '.join([char for char, count in sorted(charAnalysisResult[i].items(), key=lambda item: item[1]) 
                                       if char in string.ascii_letters][:5])
@@ -187,10 +984,1334 @@ def printAnalysisResults(typeAnalysisResult, charAnalysisResult, max_length=20):
         
         print(' '.join(row))
 
+class EntropyStats:
+    # get_entropy() always returns whole bits, so one bin per (length, bits)
+    # pair is an exact histogram whose size is bounded by max_length
+    def __init__(self, sample_size=0):
+        self.sample_size = sample_size
+        self.histogram = defaultdict(Counter)
+        self.samples = {}
+        self._sample_heap = []
+    
+    def add(self, password, entropy, weight=1):
+        self.histogram[len(password)][entropy] += weight
+        if self.sample_size:
+            self._offer_sample(password, entropy)
+    
+    def _offer_sample(self, password, entropy):
+        # Bottom-k by hash: deterministic, so merged shards keep the same sample
+        if password in self.samples:
+            return
+        key = (zlib.crc32(password.encode('utf-8', errors='surrogatepass')), password)
+        if len(self.samples) < self.sample_size:
+            heapq.heappush(self._sample_heap, (-key[0], _ReversedStr(password)))
+            self.samples[password] = (key[0], entropy)
+        elif key < (-self._sample_heap[0][0], self._sample_heap[0][1].value):
+            _, evicted = heapq.heapreplace(self._sample_heap, (-key[0], _ReversedStr(password)))
+            del self.samples[evicted.value]
+            self.samples[password] = (key[0], entropy)
+    
+    def totals(self):
+        overall = Counter()
+        for counter in self.histogram.values():
+            overall.update(counter)
+        return overall
+    
+    def summary(self):
+        overall = self.totals()
+        count = sum(overall.values())
+        if not count:
+            return None
+        average = sum(bits * n for bits, n in overall.items()) / count
+        return average, min(overall), max(overall)
+    
+    def percentiles(self, points=(10, 25, 50, 75, 90, 95, 99)):
+        overall = self.totals()
+        count = sum(overall.values())
+        results = []
+        if not count:
+            return results
+        ordered = sorted(overall.items())
+        for point in points:
+            rank = max(1, math.ceil(point / 100 * count))
+            seen = 0
+            for bits, n in ordered:
+                seen += n
+                if seen >= rank:
+                    results.append((point, bits))
+                    break
+        return results
+    
+    def by_length(self):
+        rows = []
+        for length in sorted(self.histogram):
+            counter = self.histogram[length]
+            count = sum(counter.values())
+            if count:
+                average = sum(bits * n for bits, n in counter.items()) / count
+                rows.append((length, count, average, min(counter), max(counter)))
+        return rows
+    
+    def get_state(self):
+        return {
+            'histogram': {length: dict(counter) for length, counter in self.histogram.items()},
+            'sample_size': self.sample_size,
+            'samples': {password: entropy for password, (_, entropy) in self.samples.items()}
+        }
+    
+    def merge_state(self, state):
+        _merge_counts(self.histogram, state['histogram'])
+        self.sample_size = self.sample_size or state['sample_size']
+        if self.sample_size:
+            for password, entropy in state['samples'].items():
+                self._offer_sample(password, entropy)
+
+class _ReversedStr:
+    # Heap helper so the largest (hash, password) key sits on top of a min-heap
+    __slots__ = ('value',)
+    
+    def __init__(self, value):
+        self.value = value
+    
+    def __lt__(self, other):
+        return self.value > other.value
+    
+    def __eq__(self, other):
+        return self.value == other.value
+
+APPROX_ENTRY_BYTES = 160
+APPROX_FIELDS = (
+    'patterns', 'trigram_frequency', 'derivation_bases', 'date_patterns',
+    'repetitive_sequences', 'number_suffix_patterns'
+)
+
+class ApproxCounter:
+    # Batched Space-Saving heavy hitters: keeps at most 2 * capacity keys and
+    # trims back to the capacity largest when full. A key that is not tracked
+    # reads as 'floor', the largest count trimmed so far, so every count is
+    # an upper bound and count - error a lower bound. With distinct=True a
+    # HyperLogLog sketch also estimates the number of distinct keys for len().
+    HLL_BITS = 14
+    
+    def __init__(self, capacity, distinct=False):
+        self.capacity = capacity
+        self.counts = {}
+        self.errors = {}
+        self.floor = 0
+        self.total_count = 0
+        self.registers = bytearray(1 << self.HLL_BITS) if distinct else None
+    
+    def __getitem__(self, key):
+        return self.counts.get(key, self.floor)
+    
+    def __setitem__(self, key, value):
+        if key in self.counts:
+            self.total_count += value - self.counts[key]
+        else:
+            # value was read as the floor before any trim below raises it
+            self.total_count += value - self.floor
+            error = self.floor
+            if self.registers is not None:
+                self._add_distinct(key)
+            if len(self.counts) >= 2 * self.capacity:
+                self._trim()
+            self.errors[key] = error
+        self.counts[key] = value
+    
+    def update(self, keys):
+        for key in keys:
+            self[key] += 1
+    
+    def _trim(self):
+        kept = heapq.nlargest(self.capacity + 1, self.counts.items(), key=lambda item: item[1])
+        self.floor = max(self.floor, kept.pop()[1])
+        errors = self.errors
+        self.counts = dict(kept)
+        self.errors = {key: errors[key] for key, _ in kept}
+    
+    def _add_distinct(self, key):
+        value = int.from_bytes(hashlib.blake2b(key.encode('utf-8', errors='surrogatepass'), digest_size=8).digest(), 'little')
+        index = value >> (64 - self.HLL_BITS)
+        rank = (64 - self.HLL_BITS) - (value & ((1 << (64 - self.HLL_BITS)) - 1)).bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+    
+    def error(self, key):
+        return self.errors.get(key, self.floor)
+    
+    def __contains__(self, key):
+        return key in self.counts
+    
+    def items(self):
+        return self.counts.items()
+    
+    def most_common(self, n=None):
+        ordered = sorted(self.counts.items(), key=lambda item: item[1], reverse=True)
+        return ordered if n is None else ordered[:n]
+    
+    def total(self):
+        return self.total_count
+    
+    def __len__(self):
+        if self.registers is None:
+            return len(self.counts)
+        m = len(self.registers)
+        estimate = 0.7213 / (1 + 1.079 / m) * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(m / zeros)
+        return round(estimate)
+    
+    def __bool__(self):
+        return self.total_count > 0
+    
+    def get_state(self):
+        return ('space-saving', self.capacity, self.floor, self.total_count, self.counts, self.errors,
+                None if self.registers is None else bytes(self.registers))
+    
+    def merge_state(self, state):
+        if isinstance(state, dict):
+            # exact counts from a run without --approx-memory
+            floor, total, counts, errors, registers = 0, sum(state.values()), state, {}, None
+            if self.registers is not None:
+                for key in state:
+                    self._add_distinct(key)
+        else:
+            _, _, floor, total, counts, errors, registers = state
+        merged_counts = {}
+        merged_errors = {}
+        for key in itertools.chain(self.counts, (key for key in counts if key not in self.counts)):
+            merged_counts[key] = self.counts.get(key, self.floor) + counts.get(key, floor)
+            merged_errors[key] = self.errors.get(key, self.floor) + errors.get(key, floor)
+        self.counts = merged_counts
+        self.errors = merged_errors
+        self.floor += floor
+        self.total_count += total
+        if registers is not None:
+            if self.registers is None:
+                self.registers = bytearray(len(registers))
+            self.registers = bytearray(map(max, self.registers, registers))
+        if len(self.counts) > 2 * self.capacity:
+            self._trim()
+
+def counter_total(counter):
+    return counter.total() if isinstance(counter, ApproxCounter) else sum(counter.values())
+
+def overcount_columns(counter):
+    return ["Max Overcount"] if isinstance(counter, ApproxCounter) else []
+
+def overcount_cells(counter, key):
+    return [counter.error(key)] if isinstance(counter, ApproxCounter) else []
+
+# passwords tracked as derivation candidates (heavy hitters, so memory does
+# not grow with the dump), and how often a base must occur to be reported
+DERIVATION_CAPACITY = 100000
+DERIVATION_MIN_COUNT = 2
+
+def find_derivations(bases, max_appended=4, min_base=4, min_count=DERIVATION_MIN_COUNT):
+    # A derived password is a tracked password whose longest tracked prefix
+    # (one to max_appended characters shorter) occurs min_count times; each
+    # one is attributed to that single base, so no 'base|derived' keys are
+    # built and no occurrence is counted under two appended strings
+    derivations = []
+    for derived, count in bases.items():
+        for i in range(1, min(max_appended, len(derived) - min_base) + 1):
+            base = derived[:-i]
+            if base in bases and bases[base] >= min_count:
+                derivations.append((base, derived, bases[base], count))
+                break
+    derivations.sort(key=lambda item: item[3], reverse=True)
+    return derivations
+
+def appended_counts(derivations):
+    appended = Counter()
+    for base, derived, base_count, count in derivations:
+        appended[derived[len(base):]] += count
+    return appended
+
+# passlab pattern letters -> hashcat built-in charsets
+HASHCAT_CHARSETS = {
+    'l': ('?l', string.ascii_lowercase),
+    'L': ('?u', string.ascii_uppercase),
+    'd': ('?d', string.digits),
+    's': ('?s', ''.join(chr(c) for c in range(32, 127) if not chr(c).isalnum())),
+}
+HASHCAT_CUSTOM_CHARSETS = 4
+
+def escape_hcmask(chars):
+    # ',' separates the fields of a .hcmask line and '?' starts a charset
+    return chars.replace('?', '??').replace(',', '\\,')
+
+def build_hcmask(pattern, position_counters):
+    # Narrows every position to the characters of its class observed there.
+    # A single observed character becomes a literal; the position groups
+    # with the largest keyspace reduction get the four custom charsets and
+    # the rest keep hashcat's built-in charset. Returns (line, keyspace)
+    narrowed = []
+    for position, kind in enumerate(pattern):
+        builtin, alphabet = HASHCAT_CHARSETS[kind]
+        observed = ''.join(sorted(set(position_counters.get(position, ())) & set(alphabet)))
+        narrowed.append((builtin, alphabet, observed or alphabet))
+    
+    groups = defaultdict(list)
+    for position, (builtin, alphabet, chars) in enumerate(narrowed):
+        if 1 < len(chars) < len(alphabet):
+            groups[chars].append(position)
+    ranked = sorted(groups, key=lambda chars: -sum(math.log(len(narrowed[position][1]) / len(chars)) for position in groups[chars]))
+    custom = {chars: slot for slot, chars in enumerate(ranked[:HASHCAT_CUSTOM_CHARSETS], 1)}
+    
+    mask = []
+    keyspace = 1
+    for builtin, alphabet, chars in narrowed:
+        if len(chars) == 1:
+            mask.append(escape_hcmask(chars))
+        elif chars in custom:
+            mask.append(f'?{custom[chars]}')
+        else:
+            mask.append(builtin)
+            chars = alphabet
+        keyspace *= len(chars)
+    
+    # backslash last in a charset would escape the field separator
+    charsets = [escape_hcmask(''.join(sorted(chars, key=lambda c: c != '\\'))) for chars in ranked[:HASHCAT_CUSTOM_CHARSETS]]
+    return ','.join(charsets + [''.join(mask)]), keyspace
+
+def generate_hcmasks(patterns, position_counters, total, coverage=0.9, max_keyspace=None):
+    # Ranks the observed structures by hits per candidate and keeps the best
+    # ones until they cover `coverage` of the passwords; masks that would
+    # push the total keyspace past max_keyspace are skipped. Returns rows of
+    # (line, pattern, hits, keyspace) in the order hashcat should run them
+    candidates = []
+    for pattern, hits in patterns.items():
+        if pattern:
+            line, keyspace = build_hcmask(pattern, position_counters)
+            candidates.append((hits / keyspace, line, pattern, hits, keyspace))
+    candidates.sort(key=lambda item: (-item[0], item[2]))
+    
+    rows = []
+    covered = 0
+    spent = 0
+    for _, line, pattern, hits, keyspace in candidates:
+        if covered >= coverage * total:
+            break
+        if max_keyspace and spent + keyspace > max_keyspace:
+            continue
+        rows.append((line, pattern, hits, keyspace))
+        covered += hits
+        spent += keyspace
+    return rows
+
+class MarkovModel:
+    # Dense, normalized first-order tables: root[table][position][char] is
+    # P(char at position) and trans[table][position][char][next] is
+    # P(next | char at position). Table 0 covers all lengths; the others
+    # are per password length; length_counts[length] is the number of
+    # passwords of each length. Files are little-endian and laid out so
+    # load() can memory-map the tables instead of rebuilding them
+    MAGIC = b'PPLMARKV'
+    VERSION = 2
+    HEADER = struct.Struct('<8sIIII')
+    MAX_ALPHABET = 256
+    
+    def __init__(self, alphabet, positions, lengths, length_counts, root, trans):
+        self.alphabet = alphabet
+        self.index = {char: i for i, char in enumerate(alphabet)}
+        self.positions = positions
+        self.lengths = lengths
+        self.tables = {length: table for table, length in enumerate(lengths)}
+        self.length_counts = length_counts
+        self.root = root
+        self.trans = trans
+    
+    @classmethod
+    def build(cls, position_counters, position_followers, length_distribution, length_transitions=None, character_counter=None):
+        if character_counter is None:
+            character_counter = Counter()
+            for counter in position_counters.values():
+                character_counter.update(counter)
+        # rarer characters than the alphabet can hold are dropped
+        alphabet = [char for char, _ in character_counter.most_common(cls.MAX_ALPHABET)]
+        index = {char: i for i, char in enumerate(alphabet)}
+        positions = max(position_counters, default=-1) + 1
+        length_transitions = length_transitions or {}
+        lengths = [0] + sorted(length for length in length_transitions if length <= positions)
+        size = len(alphabet)
+        root = array('f', bytes(4 * len(lengths) * positions * size))
+        trans = array('f', bytes(4 * len(lengths) * positions * size * size))
+        
+        def fill(table, chars, pairs):
+            # chars: {position: {char: count}}, pairs: {position: {char: {next: count}}}
+            for position, counter in chars.items():
+                base = (table * positions + position) * size
+                total = sum(count for char, count in counter.items() if char in index)
+                for char, count in counter.items():
+                    if char in index:
+                        root[base + index[char]] = count / total
+            for position, followers in pairs.items():
+                for char, counter in followers.items():
+                    if char not in index:
+                        continue
+                    base = ((table * positions + position) * size + index[char]) * size
+                    total = sum(count for next_char, count in counter.items() if next_char in index)
+                    for next_char, count in counter.items():
+                        if next_char in index:
+                            trans[base + index[next_char]] = count / total
+        
+        fill(0, position_counters, position_followers)
+        for table, length in enumerate(lengths[1:], 1):
+            chars = defaultdict(Counter)
+            pairs = defaultdict(lambda: defaultdict(Counter))
+            for (position, char, next_char), count in length_transitions[length].items():
+                chars[position][char] += count
+                if next_char:
+                    pairs[position][char][next_char] += count
+            fill(table, chars, pairs)
+        length_counts = array('Q', (length_distribution.get(length, 0) for length in range(positions + 1)))
+        return cls(alphabet, positions, lengths, length_counts, root, trans)
+    
+    def save(self, path):
+        root, trans = self.root, self.trans
+        if sys.byteorder == 'big':
+            root, trans = array('f', root), array('f', trans)
+            root.byteswap()
+            trans.byteswap()
+        header = self.HEADER.pack(self.MAGIC, self.VERSION, len(self.alphabet), self.positions, len(self.lengths))
+        meta = array('I', self.lengths + [ord(char) for char in self.alphabet])
+        length_counts = array('Q', self.length_counts)
+        if sys.byteorder == 'big':
+            meta.byteswap()
+            length_counts.byteswap()
+        with open(path, 'wb') as f:
+            f.write(header)
+            f.write(meta.tobytes())
+            f.write(length_counts.tobytes())
+            f.write(root.tobytes())
+            f.write(trans.tobytes())
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(data) < cls.HEADER.size or data[:len(cls.MAGIC)] != cls.MAGIC:
+            raise ValueError(f"'{path}' is not a passlab Markov model")
+        _, version, size, positions, tables = cls.HEADER.unpack_from(data)
+        if version != cls.VERSION:
+            raise ValueError(f"'{path}' uses unsupported Markov model version {version}")
+        offset = cls.HEADER.size
+        meta = array('I', data[offset:offset + 4 * (tables + size)])
+        offset += 4 * (tables + size)
+        length_counts = array('Q', data[offset:offset + 8 * (positions + 1)])
+        offset += 8 * (positions + 1)
+        root_size = tables * positions * size
+        trans_size = root_size * size
+        if len(data) != offset + 4 * (root_size + trans_size):
+            raise ValueError(f"'{path}' is truncated")
+        if sys.byteorder == 'big':
+            # big-endian hosts get a swapped copy instead of the mapping
+            meta.byteswap()
+            length_counts.byteswap()
+            root = array('f', data[offset:offset + 4 * root_size])
+            trans = array('f', data[offset + 4 * root_size:])
+            root.byteswap()
+            trans.byteswap()
+        else:
+            view = memoryview(data)
+            root = view[offset:offset + 4 * root_size].cast('f')
+            trans = view[offset + 4 * root_size:].cast('f')
+        return cls([chr(code) for code in meta[tables:]], positions, list(meta[:tables]), length_counts, root, trans)
+    
+    def _table(self, length):
+        return self.tables.get(length, 0)
+    
+    def root_probabilities(self, position, length=None):
+        size = len(self.alphabet)
+        base = (self._table(length) * self.positions + position) * size
+        row = self.root[base:base + size]
+        return sorted(((self.alphabet[i], p) for i, p in enumerate(row) if p), key=lambda item: -item[1])
+    
+    def next_probabilities(self, position, char, length=None):
+        size = len(self.alphabet)
+        if char not in self.index or position >= self.positions:
+            return []
+        base = ((self._table(length) * self.positions + position) * size + self.index[char]) * size
+        row = self.trans[base:base + size]
+        return sorted(((self.alphabet[i], p) for i, p in enumerate(row) if p), key=lambda item: -item[1])
+    
+    def probability(self, password, length=None):
+        size = len(self.alphabet)
+        if not password or len(password) > self.positions or any(char not in self.index for char in password):
+            return 0.0
+        table = self._table(length if length is not None else len(password))
+        probability = self.root[table * self.positions * size + self.index[password[0]]]
+        for position, (char, next_char) in enumerate(zip(password, password[1:])):
+            probability *= self.trans[((table * self.positions + position) * size + self.index[char]) * size + self.index[next_char]]
+        return probability
+
+# hashcat's hcstat2: an LZMA2 raw stream of big-endian u64 values, a version
+# word, a zero word, then root counts [position][byte] and transition counts
+# [position][byte][next byte] for 64 positions
+HCSTAT2_VERSION = 0x6863737461740002
+HCSTAT2_POSITIONS = 64
+
+def write_hcstat2(path, position_counters, position_followers):
+    # hashcat positions are bytes, so non-ASCII characters (several UTF-8
+    # bytes each) are left out rather than counted at the wrong offset
+    root = array('Q', bytes(8 * HCSTAT2_POSITIONS * 256))
+    markov = array('Q', bytes(8 * HCSTAT2_POSITIONS * 256 * 256))
+    for position, counter in position_counters.items():
+        if position < HCSTAT2_POSITIONS:
+            for char, count in counter.items():
+                if char.isascii():
+                    root[position * 256 + ord(char)] += count
+    for position, followers in position_followers.items():
+        if position < HCSTAT2_POSITIONS:
+            for char, counter in followers.items():
+                if not char.isascii():
+                    continue
+                base = (position * 256 + ord(char)) * 256
+                for next_char, count in counter.items():
+                    if next_char.isascii():
+                        markov[base + ord(next_char)] += count
+    if sys.byteorder == 'little':
+        root.byteswap()
+        markov.byteswap()
+    data = struct.pack('>QQ', HCSTAT2_VERSION, 0) + root.tobytes() + markov.tobytes()
+    with open(path, 'wb') as f:
+        f.write(lzma.compress(data, format=lzma.FORMAT_RAW, filters=[{'id': lzma.FILTER_LZMA2, 'preset': 9}]))
+
+GENERATE_MAX_LEVEL = 32
+GENERATE_BATCH_SIZE = 65536
+GENERATE_CACHE_SIZE = 200000
+GENERATE_SUFFIX_LIMIT = 256
+GENERATE_SUFFIX_STRINGS = 1000000
+
+class LevelGenerator:
+    # OMEN-style enumeration over a MarkovModel. Every probability becomes a
+    # level (its improbability in steps of level_bits) and candidates are
+    # produced one level sum at a time, length level + first character +
+    # transitions, so they come out in roughly descending probability while
+    # only the current search path is kept. The work of each level is cut
+    # into units of one length and a two-character prefix, numbered in a
+    # fixed order: unit numbers decide partitions and mark checkpoints
+    def __init__(self, model, level_bits=1.0, min_length=1, max_length=None):
+        self.model = model
+        self.level_bits = level_bits
+        total = sum(model.length_counts)
+        self.lengths = [
+            (length, self._level(count / total)) for length, count in enumerate(model.length_counts)
+            if count and min_length <= length <= (max_length or model.positions)
+        ]
+        self._cache = {}
+        self._children_cache = {}
+        self._count_cache = {}
+        self._suffix_cache = {}
+        self._suffix_strings = 0
+    
+    def _level(self, probability):
+        return min(GENERATE_MAX_LEVEL, int(-math.log2(probability) / self.level_bits))
+    
+    def _tables(self, length):
+        # (roots, steps, lowest, highest): roots is [(level, [char])] for the
+        # first position; steps[position][char] is [(level, [next char])]
+        # restricted to characters that can still reach the full length;
+        # lowest/highest[position][char] bound the level sum still to come
+        if length in self._cache:
+            return self._cache[length]
+        model = self.model
+        size = len(model.alphabet)
+        table = model._table(length)
+        lowest = [{} for _ in range(length)]
+        highest = [{} for _ in range(length)]
+        steps = [{} for _ in range(length - 1)]
+        for char in range(size):
+            lowest[-1][char] = highest[-1][char] = 0
+        for position in range(length - 2, -1, -1):
+            for char in range(size):
+                base = ((table * model.positions + position) * size + char) * size
+                groups = defaultdict(list)
+                for next_char, probability in enumerate(model.trans[base:base + size]):
+                    if probability and next_char in lowest[position + 1]:
+                        groups[self._level(probability)].append(next_char)
+                if groups:
+                    steps[position][char] = sorted(groups.items())
+                    lowest[position][char] = min(level + min(lowest[position + 1][n] for n in chars) for level, chars in groups.items())
+                    highest[position][char] = max(level + max(highest[position + 1][n] for n in chars) for level, chars in groups.items())
+        
+        base = table * model.positions * size
+        groups = defaultdict(list)
+        for char, probability in enumerate(model.root[base:base + size]):
+            if probability and char in lowest[0]:
+                groups[self._level(probability)].append(char)
+        self._cache[length] = tables = (sorted(groups.items()), steps, lowest, highest)
+        return tables
+    
+    def max_level(self):
+        top = -1
+        for length, length_level in self.lengths:
+            roots, _, _, highest = self._tables(length)
+            for level, chars in roots:
+                top = max(top, length_level + level + max(highest[0][char] for char in chars))
+        return top
+    
+    def units(self, level):
+        # yields (length, prefix, last char, remaining level) in a fixed order
+        alphabet = self.model.alphabet
+        for length, length_level in self.lengths:
+            rest = level - length_level
+            if rest < 0:
+                continue
+            roots, steps, lowest, highest = self._tables(length)
+            for root_level, chars in roots:
+                remaining = rest - root_level
+                if remaining < 0:
+                    break
+                for char in chars:
+                    if not lowest[0][char] <= remaining <= highest[0][char]:
+                        continue
+                    if length == 1:
+                        yield length, alphabet[char], char, 0
+                        continue
+                    for step_level, next_chars in steps[0][char]:
+                        left = remaining - step_level
+                        if left < 0:
+                            break
+                        for next_char in next_chars:
+                            if lowest[1][next_char] <= left <= highest[1][next_char]:
+                                yield length, alphabet[char] + alphabet[next_char], next_char, left
+    
+    def _children(self, length, position, char, remaining):
+        # (next char, remaining level, string) for every next character
+        # that can still end exactly on the level sum
+        key = (length, position, char, remaining)
+        children = self._children_cache.get(key)
+        if children is None:
+            alphabet = self.model.alphabet
+            _, steps, lowest, highest = self._tables(length)
+            low, high = lowest[position + 1], highest[position + 1]
+            children = []
+            for level, chars in steps[position][char]:
+                left = remaining - level
+                if left < 0:
+                    break
+                children += [(n, left, alphabet[n]) for n in chars if low[n] <= left <= high[n]]
+            self._remember(self._children_cache, key, children)
+        return children
+    
+    def _count(self, length, position, char, remaining):
+        if position == length - 1:
+            return 1
+        key = (length, position, char, remaining)
+        count = self._count_cache.get(key)
+        if count is None:
+            count = sum(self._count(length, position + 1, n, left) for n, left, _ in self._children(length, position, char, remaining))
+            self._remember(self._count_cache, key, count)
+        return count
+    
+    def _suffixes(self, length, position, char, remaining):
+        # every completion after char, kept for small subtrees because the
+        # same tails recur under many different prefixes
+        if position == length - 1:
+            return ['']
+        key = (length, position, char, remaining)
+        suffixes = self._suffix_cache.get(key)
+        if suffixes is None:
+            suffixes = [string + suffix for n, left, string in self._children(length, position, char, remaining)
+                        for suffix in self._suffixes(length, position + 1, n, left)]
+            # bounded by the number of cached strings, not of entries
+            self._suffix_strings += len(suffixes)
+            if self._suffix_strings > GENERATE_SUFFIX_STRINGS:
+                self._suffix_cache.clear()
+                self._suffix_strings = len(suffixes)
+            self._suffix_cache[key] = suffixes
+        return suffixes
+    
+    def _remember(self, cache, key, value):
+        if len(cache) >= GENERATE_CACHE_SIZE:
+            cache.clear()
+        cache[key] = value
+    
+    def expand(self, length, prefix, char, remaining):
+        # yields batches of the unit's candidates; subtrees small enough are
+        # taken whole from the suffix cache, larger ones are walked with a
+        # stack holding at most one pending sibling list per position
+        batch = []
+        stack = [(len(prefix) - 1, char, remaining, prefix)]
+        while stack:
+            position, char, remaining, prefix = stack.pop()
+            if self._count(length, position, char, remaining) <= GENERATE_SUFFIX_LIMIT:
+                batch += [prefix + suffix for suffix in self._suffixes(length, position, char, remaining)]
+                if len(batch) >= GENERATE_BATCH_SIZE:
+                    yield batch
+                    batch = []
+            else:
+                following = position + 1
+                stack += [(following, n, left, prefix + string)
+                          for n, left, string in reversed(self._children(length, position, char, remaining))]
+        if batch:
+            yield batch
+    
+    def batches(self, partition=0, partitions=1, start_unit=0, skip=0, max_level=None):
+        # yields (unit, level, batch, done): done counts the candidates of the
+        # unit emitted so far, so (unit, done) is a resumable position
+        top = self.max_level()
+        if max_level is not None:
+            top = min(top, max_level)
+        serial = 0
+        for level in range(top + 1):
+            for unit in self.units(level):
+                serial += 1
+                if serial <= start_unit or (serial - 1) % partitions != partition:
+                    continue
+                done = 0
+                for batch in self.expand(*unit):
+                    if serial == start_unit + 1 and skip:
+                        dropped = min(skip, len(batch))
+                        batch = batch[dropped:]
+                        skip -= dropped
+                        done += dropped
+                        if not batch:
+                            continue
+                    done += len(batch)
+                    yield serial - 1, level, batch, done
+
+def pcfg_class(char):
+    if char in string.digits:
+        return 'D'
+    return 'L' if char.isalpha() else 'S'
+
+def capitalization_mask(word):
+    return ''.join('U' if char.isupper() else 'L' for char in word)
+
+def apply_capitalization(word, mask):
+    if 'U' not in mask:
+        return word
+    return ''.join(char.upper() if case == 'U' else char for char, case in zip(word, mask))
+
+def compile_pcfg(structures, terminals, capitalization):
+    # Turns the pcfg plugin counts into probabilities. Terminals of one slot
+    # with the same count form a group (Weir's terminal groups): a guess
+    # template picks a group per slot, and all guesses it expands to share
+    # one probability. Alpha slot 'L4' has its capitalization in slot 'C4'
+    def groups(counter):
+        total = sum(counter.values())
+        by_count = defaultdict(list)
+        for terminal, count in counter.items():
+            by_count[count].append(terminal)
+        return [(count / total, tuple(sorted(by_count[count]))) for count in sorted(by_count, reverse=True)]
+    
+    total = sum(structures.values())
+    slots = {slot: groups(counter) for slot, counter in terminals.items() if counter}
+    for slot, counter in capitalization.items():
+        if counter:
+            slots['C' + slot[1:]] = groups(counter)
+    return {
+        'structures': [(structure, count / total) for structure, count in sorted(structures.items(), key=lambda item: (-item[1], item[0]))],
+        'slots': slots
+    }
+
+class PcfgGenerator:
+    # Weir et al.'s "next" function: guess templates (a structure plus one
+    # terminal group per slot) leave a priority queue in descending
+    # probability. A popped template pushes the templates that move one
+    # slot at or after its pivot to the next group, so every template is
+    # produced exactly once without a visited set. Templates are the units
+    # for partitions and checkpoints, numbered in pop order
+    def __init__(self, grammar, level_bits=1.0, min_length=1, max_length=None):
+        self.slots = grammar['slots']
+        self.level_bits = level_bits
+        self.structures = []
+        for structure, probability in grammar['structures']:
+            segments = [(kind, int(length)) for kind, length in re.findall(r'([LDS])(\d+)', structure)]
+            length = sum(size for _, size in segments)
+            if min_length <= length <= (max_length or length):
+                slots = []
+                for kind, size in segments:
+                    slots.append(f'{kind}{size}')
+                    if kind == 'L':
+                        slots.append(f'C{size}')
+                self.structures.append((probability, segments, slots))
+        # per structure, one (slot, groups, mask slot or None) per segment
+        self.plans = []
+        for _, segments, slots in self.structures:
+            plan = []
+            slot = 0
+            for kind, _ in segments:
+                if kind == 'L':
+                    plan.append((slot, self.slots[slots[slot]], slot + 1))
+                    slot += 2
+                else:
+                    plan.append((slot, self.slots[slots[slot]], None))
+                    slot += 1
+            self.plans.append(plan)
+        self._cased = {}
+    
+    def _start(self, structure):
+        probability, _, slots = self.structures[structure]
+        for slot in slots:
+            probability *= self.slots[slot][0][0]
+        return probability
+    
+    def templates(self):
+        # yields (probability, structure, group indices) in descending probability
+        queue = [(-self._start(structure), structure, (0,) * len(slots), 0)
+                 for structure, (_, _, slots) in enumerate(self.structures)]
+        heapq.heapify(queue)
+        heappop, heappush = heapq.heappop, heapq.heappush
+        slot_groups = [[self.slots[slot] for slot in slots] for _, _, slots in self.structures]
+        while queue:
+            probability, structure, indices, pivot = heappop(queue)
+            yield -probability, structure, indices
+            groups = slot_groups[structure]
+            for slot in range(pivot, len(groups)):
+                index = indices[slot] + 1
+                if index < len(groups[slot]):
+                    child = indices[:slot] + (index,) + indices[slot + 1:]
+                    heappush(queue, (probability / groups[slot][index - 1][0] * groups[slot][index][0], structure, child, slot))
+    
+    def _capitalized(self, structure, slot, index, mask_index):
+        key = (structure, slot, index, mask_index)
+        words = self._cased.get(key)
+        if words is None:
+            slots = self.structures[structure][2]
+            masks = self.slots[slots[slot + 1]][mask_index][1]
+            # letters without case ('한') would let several masks give the
+            # same guess, so a mask must survive the round trip
+            words = [cased for word in self.slots[slots[slot]][index][1] for mask in masks
+                     for cased in (apply_capitalization(word, mask),) if capitalization_mask(cased) == mask]
+            if len(self._cased) >= GENERATE_CACHE_SIZE:
+                self._cased.clear()
+            self._cased[key] = words
+        return words
+    
+    def expand(self, structure, indices):
+        # returns the template's guesses as a list of batches or an iterator
+        parts = [groups[indices[slot]][1] if mask is None else self._capitalized(structure, slot, indices[slot], indices[mask])
+                 for slot, groups, mask in self.plans[structure]]
+        if len(parts) == 1:
+            return [parts[0]] if len(parts[0]) <= GENERATE_BATCH_SIZE else iter_batches(parts[0], GENERATE_BATCH_SIZE)
+        if math.prod(map(len, parts)) <= GENERATE_BATCH_SIZE:
+            return [list(map(''.join, itertools.product(*parts)))]
+        guesses = map(''.join, itertools.product(*parts))
+        return iter(lambda: list(itertools.islice(guesses, GENERATE_BATCH_SIZE)), [])
+    
+    def batches(self, partition=0, partitions=1, start_unit=0, skip=0, max_level=None):
+        # same contract as LevelGenerator.batches; a template's level is its
+        # own improbability in level_bits steps
+        for unit, (probability, structure, indices) in enumerate(self.templates()):
+            level = int(-math.log2(probability) / self.level_bits)
+            if max_level is not None and level > max_level:
+                return
+            if unit < start_unit or unit % partitions != partition:
+                continue
+            done = 0
+            for batch in self.expand(structure, indices):
+                if unit == start_unit and skip:
+                    dropped = min(skip, len(batch))
+                    batch = batch[dropped:]
+                    skip -= dropped
+                    done += dropped
+                    if not batch:
+                        continue
+                done += len(batch)
+                yield unit, level, batch, done
+
+class WordMatcher:
+    # Aho-Corasick automaton: finds every dictionary word contained in a
+    # password in a single left-to-right pass
+    CACHE_MAGIC = b'PPLDICT'
+    CACHE_VERSION = 1
+    
+    def __init__(self, goto, fail, output):
+        self.goto = goto
+        self.fail = fail
+        self.output = output
+    
+    @classmethod
+    def build(cls, words, min_length=4):
+        goto = [{}]
+        output = [()]
+        for word in sorted(set(words)):
+            if len(word) < min_length:
+                continue
+            node = 0
+            for char in word:
+                next_node = goto[node].get(char)
+                if next_node is None:
+                    next_node = len(goto)
+                    goto[node][char] = next_node
+                    goto.append({})
+                    output.append(())
+                node = next_node
+            output[node] = ((word, len(word)),)
+        
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        for node in queue:
+            for char, child in goto[node].items():
+                state = fail[node]
+                while state and char not in goto[state]:
+                    state = fail[state]
+                target = goto[state].get(char, 0)
+                fail[child] = target if target != child else 0
+                output[child] = output[child] + output[fail[child]]
+                queue.append(child)
+        return cls(goto, fail, output)
+    
+    def find(self, text):
+        goto, fail, output = self.goto, self.fail, self.output
+        found = {}
+        node = 0
+        for end, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                for word, length in output[node]:
+                    if word not in found:
+                        found[word] = end - length + 1
+        return found
+    
+    def __len__(self):
+        return len(self.goto) - 1
+    
+    @staticmethod
+    def cache_key(dictionary_path):
+        info = os.stat(dictionary_path)
+        return [os.path.abspath(dictionary_path), info.st_size, info.st_mtime_ns]
+    
+    def save(self, path, key):
+        with open(path, 'wb') as f:
+            f.write(self.CACHE_MAGIC + bytes([self.CACHE_VERSION]))
+            f.write(zlib.compress(marshal.dumps([key, self.goto, self.fail, self.output]), 1))
+    
+    @classmethod
+    def load(cls, path, key):
+        with open(path, 'rb') as f:
+            if f.read(len(cls.CACHE_MAGIC) + 1) != cls.CACHE_MAGIC + bytes([cls.CACHE_VERSION]):
+                return None
+            cached_key, goto, fail, output = marshal.loads(zlib.decompress(f.read()))
+        if cached_key != key:
+            return None
+        return cls(goto, fail, output)
+
+class NumpyPositionEngine:
+    # Batches ASCII passwords into a fixed-width uint8 matrix and counts
+    # per-position characters and per-position bigrams with bincount.
+    # Passwords with other characters are counted in dicts keyed the same
+    # way. Every entry remembers the first password that produced it, so
+    # flush_into() adds keys to the analyzer's Counters in the order the
+    # Python engine would have, and ties in most_common() come out the same.
+    UNSEEN = np.iinfo(np.int64).max if np is not None else None
+    
+    def __init__(self, max_length, batch_size=65536):
+        self.max_length = max_length
+        self.batch_size = batch_size
+        self.batch = []
+        self.weights = []
+        self.sequences = []
+        self.sequence = 0
+        self.char_counts = np.zeros((max_length, 128), dtype=np.int64)
+        self.pair_counts = np.zeros((max(max_length - 1, 1), 128, 128), dtype=np.int64)
+        self.char_seen = np.full(self.char_counts.shape, self.UNSEEN, dtype=np.int64)
+        self.pair_seen = np.full(self.pair_counts.shape, self.UNSEEN, dtype=np.int64)
+        # (position, char[, next char]) -> [first sequence, count]
+        self.other_chars = {}
+        self.other_pairs = {}
+    
+    def add(self, password, weight=1):
+        self.batch.append(password.encode('ascii'))
+        self.weights.append(weight)
+        self.sequences.append(self.sequence)
+        self.sequence += 1
+        if len(self.batch) >= self.batch_size:
+            self._count_batch()
+    
+    def add_other(self, password, weight=1):
+        sequence = self.sequence
+        self.sequence += 1
+        for key in enumerate(password):
+            entry = self.other_chars.get(key)
+            if entry is None:
+                self.other_chars[key] = [sequence, weight]
+            else:
+                entry[1] += weight
+        for position, (char, next_char) in enumerate(zip(password, password[1:])):
+            key = (position, char, next_char)
+            entry = self.other_pairs.get(key)
+            if entry is None:
+                self.other_pairs[key] = [sequence, weight]
+            else:
+                entry[1] += weight
+    
+    def _count_batch(self):
+        if not self.batch:
+            return
+        width = self.max_length
+        lengths = np.fromiter((len(p) for p in self.batch), dtype=np.int64, count=len(self.batch))
+        matrix = np.frombuffer(b''.join(p.ljust(width, b'\0') for p in self.batch), dtype=np.uint8)
+        matrix = matrix.reshape(len(self.batch), width).astype(np.int64)
+        weights = np.array(self.weights, dtype=np.int64)
+        sequences = np.array(self.sequences, dtype=np.int64)
+        self.batch = []
+        self.weights = []
+        self.sequences = []
+        # unweighted batches skip the float64 weights bincount would need
+        weighted = bool((weights != 1).any())
+        
+        positions = np.arange(width)
+        valid = positions < lengths[:, None]
+        cells = np.broadcast_to(positions, matrix.shape)[valid] * 128 + matrix[valid]
+        self.char_counts += self._bincount(cells, weights, valid, weighted, width * 128).reshape(width, 128)
+        self._first_seen(self.char_seen.reshape(-1), cells, np.broadcast_to(sequences[:, None], valid.shape)[valid])
+        
+        if width > 1:
+            valid = positions[:-1] < (lengths - 1)[:, None]
+            pairs = (np.broadcast_to(positions[:-1], (len(lengths), width - 1))[valid] * 128
+                     + matrix[:, :-1][valid]) * 128 + matrix[:, 1:][valid]
+            self.pair_counts += self._bincount(pairs, weights, valid, weighted, (width - 1) * 128 * 128).reshape(width - 1, 128, 128)
+            self._first_seen(self.pair_seen.reshape(-1), pairs, np.broadcast_to(sequences[:, None], valid.shape)[valid])
+    
+    def _bincount(self, cells, weights, valid, weighted, size):
+        if not weighted:
+            return np.bincount(cells, minlength=size)
+        cell_weights = np.broadcast_to(weights[:, None], valid.shape)[valid]
+        return np.rint(np.bincount(cells, weights=cell_weights, minlength=size)).astype(np.int64)
+    
+    def _first_seen(self, seen, cells, cell_sequences):
+        # cells are in password order, so np.unique's first index is the
+        # earliest password; only cells not seen in earlier batches are sorted
+        new = seen[cells] == self.UNSEEN
+        if new.any():
+            cells = cells[new]
+            unique, first = np.unique(cells, return_index=True)
+            seen[unique] = cell_sequences[new][first]
+    
+    def flush_into(self, analyzer):
+        self._count_batch()
+        chars = self.other_chars
+        for position, code in zip(*np.nonzero(self.char_counts)):
+            key = (int(position), chr(code))
+            sequence, count = int(self.char_seen[position, code]), int(self.char_counts[position, code])
+            entry = chars.setdefault(key, [sequence, 0])
+            entry[0] = min(entry[0], sequence)
+            entry[1] += count
+        
+        # positions are filled from the first up, so per-position order only
+        # depends on the password sequence
+        for (position, char), (sequence, count) in sorted(chars.items(), key=lambda item: (item[0][0], item[1][0])):
+            analyzer.position_character_counters[position][char] += count
+            analyzer.position_type_counters[position][MASK_CATEGORIES[password_mask(char)]] += count
+        
+        pairs = self.other_pairs
+        for position, first, second in zip(*np.nonzero(self.pair_counts)):
+            key = (int(position), chr(first), chr(second))
+            sequence, count = int(self.pair_seen[position, first, second]), int(self.pair_counts[position, first, second])
+            entry = pairs.setdefault(key, [sequence, 0])
+            entry[0] = min(entry[0], sequence)
+            entry[1] += count
+        
+        # the overall followers interleave positions as a sequential scan does
+        for (position, char, next_char), (sequence, count) in sorted(pairs.items(), key=lambda item: (item[1][0], item[0][0])):
+            analyzer.position_followers[position][char][next_char] += count
+            analyzer.followers[char][next_char] += count
+        
+        self.char_counts[:] = 0
+        self.pair_counts[:] = 0
+        self.char_seen[:] = self.UNSEEN
+        self.pair_seen[:] = self.UNSEEN
+        self.other_chars = {}
+        self.other_pairs = {}
+
+STATE_FIELDS = (
+    'total_passwords', 'filtered_passwords', 'valid_passwords', 'length_distribution',
+    'position_character_counters', 'position_type_counters', 'followers', 'position_followers',
+    'character_overall_counter', 'total_chars', 'patterns', 'entropy_stats',
+    'repetitive_sequences', 'keyboard_sequences', 'date_patterns', 'common_words',
+    'leetspeak_count', 'numeric_sequences', 'capitalization_patterns', 'word_boundaries',
+    'derivation_bases', 'trigram_frequency', 'english_words_detected', 'number_suffix_patterns',
+    'special_char_positions', 'complexity_distribution', 'filtered_position_counters',
+    'malformed_lines', 'unique_passwords', 'unique_valid', 'unique_length_distribution',
+    'unique_patterns', 'unique_features'
+)
+
+def _plain_counts(value):
+    if hasattr(value, 'get_state'):
+        return value.get_state()
+    if isinstance(value, dict):
+        return {key: _plain_counts(item) for key, item in value.items()}
+    return value
+
+def _merge_counts(target, source):
+    for key, value in source.items():
+        if isinstance(value, dict):
+            _merge_counts(target[key], value)
+        else:
+            target[key] += value
+
+# One row per source in runs; every counter table is keyed by run_id first,
+# so a run's rows are contiguous and per-run queries are index range scans
+SQLITE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    source TEXT NOT NULL UNIQUE,
+    exported TEXT NOT NULL,
+    total_passwords INTEGER NOT NULL,
+    valid_passwords INTEGER NOT NULL,
+    filtered_passwords INTEGER NOT NULL,
+    unique_passwords INTEGER,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS lengths (
+    run_id INTEGER NOT NULL, length INTEGER NOT NULL, count INTEGER NOT NULL, unique_count INTEGER,
+    PRIMARY KEY (run_id, length)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS masks (
+    run_id INTEGER NOT NULL, mask TEXT NOT NULL, length INTEGER NOT NULL, count INTEGER NOT NULL, unique_count INTEGER,
+    PRIMARY KEY (run_id, mask)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS masks_by_length ON masks (run_id, length, count);
+CREATE TABLE IF NOT EXISTS complexity (
+    run_id INTEGER NOT NULL, level INTEGER NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, level)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS entropy (
+    run_id INTEGER NOT NULL, length INTEGER NOT NULL, bits INTEGER NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, length, bits)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS characters (
+    run_id INTEGER NOT NULL, character TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, character)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS positions (
+    run_id INTEGER NOT NULL, position INTEGER NOT NULL, character TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, position, character)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS position_types (
+    run_id INTEGER NOT NULL, position INTEGER NOT NULL, type TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, position, type)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS followers (
+    run_id INTEGER NOT NULL, character TEXT NOT NULL, follower TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, character, follower)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS position_followers (
+    run_id INTEGER NOT NULL, position INTEGER NOT NULL, character TEXT NOT NULL, follower TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, position, character, follower)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS trigrams (
+    run_id INTEGER NOT NULL, trigram TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, trigram)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS trigrams_by_trigram ON trigrams (trigram);
+CREATE TABLE IF NOT EXISTS features (
+    run_id INTEGER NOT NULL, feature TEXT NOT NULL, key TEXT NOT NULL, count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, feature, key)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS derivations (
+    run_id INTEGER NOT NULL, base TEXT NOT NULL, appended TEXT NOT NULL,
+    base_count INTEGER NOT NULL, derived_count INTEGER NOT NULL,
+    PRIMARY KEY (run_id, base, appended)
+) WITHOUT ROWID;
+'''
+
+SQLITE_TABLES = ('lengths', 'masks', 'complexity', 'entropy', 'characters', 'positions', 'position_types',
+                 'followers', 'position_followers', 'trigrams', 'features', 'derivations')
+
+STATE_MAGIC = b'PPLSTATE'
+STATE_VERSION = 7
+
+def write_state_file(path, snapshot):
+    with open(path, 'wb') as f:
+        f.write(STATE_MAGIC + bytes([STATE_VERSION]))
+        f.write(zlib.compress(marshal.dumps(snapshot), 6))
+
+def read_state_file(path):
+    with open(path, 'rb') as f:
+        header = f.read(len(STATE_MAGIC) + 1)
+        if header[:len(STATE_MAGIC)] != STATE_MAGIC:
+            raise ValueError(f"'{path}' is not a passlab state file")
+        if header[-1] != STATE_VERSION:
+            raise ValueError(f"'{path}' uses unsupported state version {header[-1]}")
+        return marshal.loads(zlib.decompress(f.read()))
+
+GRAMMAR_MAGIC = b'PPLPCFG'
+GRAMMAR_VERSION = 1
+
+def write_grammar_file(path, grammar):
+    with open(path, 'wb') as f:
+        f.write(GRAMMAR_MAGIC + bytes([GRAMMAR_VERSION]))
+        f.write(zlib.compress(marshal.dumps(grammar), 9))
+
+def read_grammar_file(path):
+    with open(path, 'rb') as f:
+        header = f.read(len(GRAMMAR_MAGIC) + 1)
+        if header[:len(GRAMMAR_MAGIC)] != GRAMMAR_MAGIC:
+            raise ValueError(f"'{path}' is not a passlab grammar file")
+        if header[-1] != GRAMMAR_VERSION:
+            raise ValueError(f"'{path}' uses unsupported grammar version {header[-1]}")
+        return marshal.loads(zlib.decompress(f.read()))
+
+def split_file_ranges(file_path, parts):
+    with open(file_path, 'rb') as file:
+        reader = MappedLineReader.open(file)
+        if reader is None:
+            return []
+        with reader:
+            return reader.ranges(parts)
+
+_worker_analyzer = None
+
+def _init_worker(config, word_matcher):
+    global _worker_analyzer
+    _worker_analyzer = PasswordAnalyzer(**dict(config, dictionary=None))
+    _worker_analyzer.dictionary_file = config['dictionary']
+    _worker_analyzer.word_matcher = word_matcher
+
+def _analyze_range(byte_range):
+    analyzer = _worker_analyzer
+    analyzer._reset_counters()
+    analyzer._consume(iter_file_lines(analyzer.file_path, *byte_range))
+    analyzer._finish_pass()
+    return analyzer.get_state()
+
+def _analyze_records(records):
+    analyzer = _worker_analyzer
+    analyzer._reset_counters()
+    analyzer._consume_records(records)
+    analyzer._finish_pass()
+    return analyzer.get_state()
+
+def iter_batches(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+def approx_size(value):
+    # Deep size of a counter: the containers plus their keys and values,
+    # following instance attributes of objects such as ApproxCounter
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += sys.getsizeof(key) + approx_size(item)
+    elif isinstance(value, (list, tuple, set, deque)):
+        size += sum(approx_size(item) for item in value)
+    elif hasattr(value, '__dict__') and not callable(value):
+        size += approx_size(vars(value))
+    return size
+
+PROFILE_INTERVAL = 100000
+
+class StageProfiler:
+    # Cumulative time and call counts of the wrapped analyzer methods, plus
+    # a throughput sample every PROFILE_INTERVAL lines. Stage times are
+    # inclusive here; report() subtracts nested stages to get self times
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.samples = []
+    
+    def wrap(self, name, function):
+        stage = self.stages.setdefault(name, [0.0, 0])
+        clock = time.perf_counter
+        def timed(*args):
+            start = clock()
+            result = function(*args)
+            stage[0] += clock() - start
+            stage[1] += 1
+            return result
+        return timed
+    
+    def count_lines(self, lines):
+        count = 0
+        self.sample(count)
+        for line in lines:
+            count += 1
+            if count % PROFILE_INTERVAL == 0:
+                self.sample(count)
+            yield line
+        self.sample(count)
+    
+    def sample(self, lines):
+        self.samples.append((time.perf_counter() - self.started, lines))
+    
+    def _seconds(self, *names):
+        return sum(self.stages[name][0] for name in names if name in self.stages)
+    
+    def report(self, analyzer):
+        stages = {}
+        def add(name, timed, seconds=None):
+            if self.stages.get(timed, (0, 0))[1]:
+                total, calls = self.stages[timed]
+                stages[name] = {'seconds': round(total if seconds is None else seconds, 6), 'calls': calls}
+        
+        plugins = [name for name in self.stages if name.startswith('plugin.')]
+        detectors = ('enhanced.features', 'enhanced.keyboard', 'enhanced.dictionary')
+        add('read_decode', 'consume', self._seconds('consume') - self._seconds('process_line'))
+        add('filtering', 'process_line', self._seconds('process_line')
+            - self._seconds('analyze_password', 'enhanced_analysis', *plugins))
+        add('analyze_password', 'analyze_password')
+        for name in detectors:
+            add(name, name)
+        add('enhanced.counting', 'enhanced_analysis', self._seconds('enhanced_analysis') - self._seconds(*detectors))
+        for name in plugins:
+            add(name, name)
+        for name in self.stages:
+            if name.startswith(('finish_pass', 'merge_state', 'parallel', 'report.', 'export')):
+                add(name, name)
+        
+        throughput = []
+        previous = self.samples[0] if self.samples else None
+        for seconds, lines in self.samples[1:]:
+            if seconds > previous[0]:
+                throughput.append({'seconds': round(seconds, 3), 'lines': lines,
+                                   'lines_per_second': round((lines - previous[1]) / (seconds - previous[0]))})
+            previous = (seconds, lines)
+        
+        elapsed = time.perf_counter() - self.started
+        profile = {
+            'file': analyzer.file_path,
+            'workers': analyzer.workers,
+            'engine': 'numpy' if analyzer.position_engine else 'python',
+            'total_seconds': round(elapsed, 3),
+            'lines': analyzer.total_passwords,
+            'lines_per_second': round(analyzer.total_passwords / elapsed) if elapsed else 0,
+            'stages': stages,
+            'throughput': throughput,
+            'counter_bytes': {name: approx_size(getattr(analyzer, name)) for name in STATE_FIELDS
+                              if not isinstance(getattr(analyzer, name), int)},
+            'plugin_bytes': {plugin.name: approx_size(plugin) for plugin in analyzer.plugins}
+        }
+        if resource:
+            # kilobytes on Linux, bytes on macOS
+            profile['max_rss'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return profile
+
 class PasswordAnalyzer:
     def __init__(self, file_path, max_length=32, min_length=1, output_dir=None, 
                  exclude_non_ascii=False, pattern=None, verbose=False,
-                 dictionary=None, enhanced=False):
+                 dictionary=None, enhanced=False, workers=1, entropy_samples=0,
+                 dictionary_cache=None, keyboard_layout=None, keyboard_min_walk=4,
+                 engine='python', plugins=(), approx_memory=0, input_format='plain',
+                 dedup=False, dedup_memory=512, dedup_dir=None, sample_rate=0,
+                 sample_size=0, sample_method=None, sample_seed=None, profile=False):
+        self.config = {
+            'file_path': file_path, 'max_length': max_length, 'min_length': min_length,
+            'exclude_non_ascii': exclude_non_ascii, 'pattern': pattern,
+            'dictionary': dictionary, 'enhanced': enhanced, 'entropy_samples': entropy_samples,
+            'dictionary_cache': dictionary_cache, 'keyboard_layout': keyboard_layout,
+            'keyboard_min_walk': keyboard_min_walk, 'engine': engine, 'plugins': list(plugins),
+            'approx_memory': approx_memory, 'input_format': input_format,
+            'dedup': dedup, 'dedup_memory': dedup_memory, 'dedup_dir': dedup_dir
+        }
+        self.sample_rate = sample_rate
+        self.sample_size = sample_size
+        self.sample_method = 'rate' if sample_rate else (sample_method or 'seek') if sample_size else None
+        self.sample_rng = random.Random(sample_seed)
+        self.profiler = StageProfiler() if profile else None
         self.file_path = file_path
         self.max_length = max_length
         self.min_length = min_length
@@ -199,23 +2320,132 @@ class PasswordAnalyzer:
         self.pattern = pattern
         self.verbose = verbose
         self.enhanced = enhanced
+        self.workers = max(1, workers)
+        self.sources = []
+        self.entropy_samples = entropy_samples
+        self.plugin_names = list(plugins)
+        self.input_format = input_format
+        self.dedup = dedup
+        self.dedup_memory = dedup_memory
+        self.dedup_dir = dedup_dir
+        self.approx_capacity = 0
+        if approx_memory:
+            # two dict entries per key, and up to twice the capacity before a trim
+            self.approx_capacity = max(1000, approx_memory * 2**20 // (len(APPROX_FIELDS) * 2 * APPROX_ENTRY_BYTES))
+        
+        self.position_engine = None
+        if engine == 'numpy':
+            if np is None:
+                print(f"{Colors.RED}Error: the numpy engine requires NumPy (pip install numpy).{Colors.RESET}")
+                sys.exit(1)
+            self.position_engine = NumpyPositionEngine(max_length)
         self.dictionary_file = dictionary
-        self.dictionary_words = set()
+        self.dictionary_cache = dictionary_cache
+        self.word_matcher = None
+        self.special_chars = set('!@#$%^&*()-_=+[]{};:\'",.<>/?\\|~`')
+        
+        self._reset_counters()
+        
+        self.keyboard_layouts = dict(KEYBOARD_LAYOUTS)
+        if keyboard_layout:
+            try:
+                self.keyboard_layouts.update(load_keyboard_layouts(keyboard_layout))
+            except Exception as e:
+                print(f"{Colors.RED}Error loading keyboard layout file: {e}{Colors.RESET}")
+        self.keyboard_detector = KeyboardWalkDetector(self.keyboard_layouts, keyboard_min_walk)
+        
+        self.pattern_matcher = None
+        if pattern:
+            try:
+                self.pattern_matcher = re.compile(pattern_to_regex(pattern))
+            except re.error:
+                self.pattern_matcher = None
+        
+        # kept on the instance so --profile can time it like the other detectors
+        self.feature_scanner = scan_enhanced_features
+        
+        if dictionary:
+            self._load_dictionary()
+        
+        if self.profiler:
+            self._instrument()
+    
+    def _instrument(self):
+        # Only the main process is instrumented; with --workers the scan
+        # shows up as the parallel and merge_state stages
+        wrap = self.profiler.wrap
+        for method, stage in (('_process_line', 'process_line'), ('_analyze_password', 'analyze_password'),
+                              ('_enhanced_analysis', 'enhanced_analysis'), ('_finish_pass', 'finish_pass'),
+                              ('merge_state', 'merge_state'), ('_analyze_parallel', 'parallel'),
+                              ('export_results', 'export'), ('export_sqlite', 'export_sqlite'),
+                              ('export_hcmask', 'export_hcmask'), ('export_markov', 'export_markov'),
+                              ('export_hcstat2', 'export_hcstat2'), ('export_pcfg', 'export_pcfg')):
+            setattr(self, method, wrap(stage, getattr(self, method)))
+        consume = wrap('consume', self._consume)
+        self._consume = lambda lines: consume(self.profiler.count_lines(lines))
+        for name in ('summary', 'character_analysis', 'entropy_analysis', 'position_analysis',
+                     'follower_analysis', 'enhanced_analysis', 'classic_analysis', 'plugin_reports'):
+            setattr(self, f'print_{name}', wrap(f'report.{name}', getattr(self, f'print_{name}')))
+        if self.workers > 1 and not self.sample_method:
+            # the word matcher is sent to the workers and must stay picklable
+            return
+        self.feature_scanner = wrap('enhanced.features', self.feature_scanner)
+        self.keyboard_detector.find = wrap('enhanced.keyboard', self.keyboard_detector.find)
+        if self.word_matcher:
+            self.word_matcher.find = wrap('enhanced.dictionary', self.word_matcher.find)
+    
+    def write_profile(self, path):
+        try:
+            with open(path, 'w') as f:
+                json.dump(self.profiler.report(self), f, indent=2)
+            print(f"{Colors.GREEN}Profile written to: {path}{Colors.RESET}")
+        except Exception as e:
+            print(f"{Colors.RED}Error writing profile: {e}{Colors.RESET}")
+            sys.exit(1)
+    
+    def _load_dictionary(self):
+        try:
+            key = WordMatcher.cache_key(self.dictionary_file)
+            if self.dictionary_cache and os.path.exists(self.dictionary_cache):
+                try:
+                    self.word_matcher = WordMatcher.load(self.dictionary_cache, key)
+                except Exception:
+                    self.word_matcher = None
+                if self.word_matcher is not None:
+                    if self.verbose:
+                        print(f"Loaded dictionary automaton from {self.dictionary_cache}")
+                    return
+            
+            with open(self.dictionary_file, 'r', encoding='utf-8', errors='ignore') as f:
+                self.word_matcher = WordMatcher.build(word.strip().lower() for word in f)
+            if self.verbose:
+                print(f"Compiled dictionary automaton with {len(self.word_matcher)} states")
+        except:
+            print(f"{Colors.RED}Error loading dictionary file.{Colors.RESET}")
+            return
         
+        if self.dictionary_cache:
+            try:
+                self.word_matcher.save(self.dictionary_cache, key)
+            except OSError as e:
+                print(f"{Colors.YELLOW}Warning: could not write dictionary cache: {e}{Colors.RESET}")
+    
+    def _reset_counters(self):
         self.total_passwords = 0
         self.filtered_passwords = 0
         self.valid_passwords = 0
+        self.malformed_lines = 0
         self.length_distribution = Counter()
-        self.special_chars = set('!@#$%^&*()-_=+[]{};:\'",.<>/?\\|~`')
         
         self.position_character_counters = defaultdict(Counter)
+        self.filtered_position_counters = defaultdict(Counter)
         self.position_type_counters = defaultdict(lambda: Counter({'lowercase': 0, 'uppercase': 0, 'digit': 0, 'special': 0}))
         self.followers = defaultdict(Counter)
         self.position_followers = defaultdict(lambda: defaultdict(Counter))
         self.character_overall_counter = Counter()
         self.total_chars = 0
         self.patterns = Counter()
-        self.password_entropy = []
+        self.entropy_stats = EntropyStats(self.entropy_samples)
         
         self.repetitive_sequences = Counter()
         self.keyboard_sequences = Counter()
@@ -225,63 +2455,56 @@ class PasswordAnalyzer:
         self.numeric_sequences = 0
         self.capitalization_patterns = Counter()
         self.word_boundaries = Counter()
-        self.password_pairs = Counter()
+        self.derivation_bases = ApproxCounter(DERIVATION_CAPACITY)
         self.trigram_frequency = Counter()
         self.english_words_detected = 0
         self.number_suffix_patterns = Counter()
         self.special_char_positions = defaultdict(int)
         self.complexity_distribution = defaultdict(int)
         
-        self.keyboard_layouts = {
-            'QWERTY': ['qwertyuiop', 'asdfghjkl', 'zxcvbnm'],
-            'AZERTY': ['azertyuiop', 'qsdfghjklm', 'wxcvbn'],
-            'Numeric': ['123', '456', '789', '0']
-        }
+        # per unique password rather than per occurrence; only filled by --dedup
+        self.unique_passwords = 0
+        self.unique_valid = 0
+        self.unique_length_distribution = Counter()
+        self.unique_patterns = Counter()
+        self.unique_features = Counter()
         
-        self.pattern_matcher = None
-        if pattern:
-            try:
-                self.pattern_matcher = re.compile(pattern_to_regex(pattern))
-            except re.error:
-                self.pattern_matcher = None
+        if self.approx_capacity:
+            for name in APPROX_FIELDS:
+                setattr(self, name, ApproxCounter(self.approx_capacity, distinct=(name == 'date_patterns')))
+            if self.dedup:
+                self.unique_patterns = ApproxCounter(self.approx_capacity)
         
-        if dictionary:
-            try:
-                with open(dictionary, 'r', encoding='utf-8', errors='ignore') as f:
-                    self.dictionary_words = set(word.strip().lower() for word in f)
-            except:
-                print(f"{Colors.RED}Error loading dictionary file.{Colors.RESET}")
+        self.plugins = create_plugins(self.plugin_names)
+        self.plugin_updates = [plugin.update for plugin in self.plugins]
+        if getattr(self, 'profiler', None):
+            self.plugin_updates = [self.profiler.wrap(f'plugin.{plugin.name}', plugin.update) for plugin in self.plugins]
     
     def analyze(self):
         start_time = datetime.now()
         
         try:
-            with open(self.file_path, 'r', encoding='utf-8', errors='ignore') as file:
-                for line in file:
-                    password = line.strip()
-                    self.total_passwords += 1
-                    
-                    if self.exclude_non_ascii and not is_ascii_printable(password):
-                        self.filtered_passwords += 1
-                        continue
-                    
-                    if len(password) < self.min_length or len(password) > self.max_length:
-                        self.filtered_passwords += 1
-                        continue
-                    
-                    if self.pattern_matcher and not self.pattern_matcher.match(password):
-                        self.filtered_passwords += 1
-                        continue
-                    
-                    self.valid_passwords += 1
-                    self.length_distribution[len(password)] += 1
-                    self._analyze_password(password)
-                    
-                    if self.enhanced:
-                        self._enhanced_analysis(password)
-                    
-                    if self.verbose and self.total_passwords % 100000 == 0:
-                        print(f"Processed {self.total_passwords} passwords...")
+            ranges = None
+            if self.sample_method:
+                self.workers = 1
+            if self.workers > 1 and not self.dedup:
+                ranges = split_input_ranges(self.file_path, self.workers * 4)
+                if ranges is None:
+                    print(f"{Colors.YELLOW}Standard input and single-stream compressed files cannot be split; analyzing with a single process.{Colors.RESET}")
+                    self.workers = 1
+            if ranges:
+                self._analyze_parallel(ranges)
+            elif self.dedup and self.workers > 1:
+                # duplicates are collapsed here and the unique passwords are
+                # handed to the workers in batches
+                records = self._records(iter_file_lines(self.file_path))
+                self._analyze_parallel(iter_batches(records, DEDUP_BATCH_SIZE), _analyze_records)
+            elif self.sample_method:
+                self._consume(self._sample_lines())
+                self._finish_pass()
+            else:
+                self._consume(iter_file_lines(self.file_path))
+                self._finish_pass()
         
         except FileNotFoundError:
             print(f"{Colors.RED}Error: File '{self.file_path}' not found.{Colors.RESET}")
@@ -295,118 +2518,321 @@ class PasswordAnalyzer:
         print(f"Total passwords: {self.total_passwords}")
         print(f"Valid passwords processed: {self.valid_passwords}")
         print(f"Filtered passwords: {self.filtered_passwords}")
+        if self.dedup:
+            print(f"Unique passwords: {self.unique_passwords}")
+        if self.malformed_lines:
+            print(f"{Colors.YELLOW}Skipped {self.malformed_lines} lines that are not valid {self.input_format} records.{Colors.RESET}")
+    
+    def _sample_lines(self):
+        if self.sample_method == 'rate':
+            rate, rng = self.sample_rate, self.sample_rng
+            return (line for line in iter_file_lines(self.file_path) if rng.random() < rate)
+        if self.sample_method == 'seek':
+            lines = seek_sample_lines(self.file_path, self.sample_size, self.sample_rng)
+            if lines is not None:
+                return lines
+            print(f"{Colors.YELLOW}Standard input, compressed files and files with fewer lines than the sample "
+                  f"cannot be seek-sampled; using a reservoir sample.{Colors.RESET}")
+            self.sample_method = 'reservoir'
+        if self.sample_method == 'stratified':
+            # strata are the lengths of the parsed passwords, not of the raw lines
+            input_format = self.input_format
+            if input_format == 'plain':
+                key = lambda line: len(line.strip())
+            else:
+                key = lambda line: len(next(iter_weighted_records((line,), input_format))[0].strip())
+            return stratified_sample(iter_file_lines(self.file_path), self.sample_size, self.sample_rng, key)
+        return reservoir_sample(iter_file_lines(self.file_path), self.sample_size, self.sample_rng)
+    
+    def _consume(self, lines):
+        if self.input_format == 'plain' and not self.dedup:
+            for line in lines:
+                self._process_line(line)
+                
+                if self.verbose and self.total_passwords % 100000 == 0:
+                    print(f"Processed {self.total_passwords} passwords...")
+            return
         
-    def _analyze_password(self, password):
-        pattern = ''.join(self._get_pattern_char(c) for c in password)
-        self.patterns[pattern] += 1
+        self._consume_records(self._records(lines))
+    
+    def _records(self, lines):
+        if self.input_format == 'plain':
+            records = ((line.strip(), 1) for line in lines)
+        else:
+            records = self._parse_records(lines)
+        if self.dedup:
+            records = dedup_records(records, self.dedup_memory, self.dedup_dir)
+        return records
+    
+    def _parse_records(self, lines):
+        for password, weight in iter_weighted_records(lines, self.input_format):
+            if weight:
+                yield password.strip(), weight
+            else:
+                self.malformed_lines += 1
+    
+    def _consume_records(self, records):
+        unit = "unique passwords" if self.dedup else "records"
+        for count, (password, weight) in enumerate(records, 1):
+            self._process_line(password, weight)
+            
+            if self.verbose and count % 100000 == 0:
+                print(f"Processed {count} {unit} ({self.total_passwords} passwords)...")
+    
+    def _finish_pass(self):
+        if self.position_engine:
+            self.position_engine.flush_into(self)
+    
+    def _process_line(self, line, weight=1):
+        password = line.strip()
+        self.total_passwords += weight
+        if self.dedup:
+            self.unique_passwords += 1
+        # plugins reproduce the standalone scripts, which see every line
+        for update in self.plugin_updates:
+            update(password, weight)
         
-        entropy = get_entropy(password)
-        self.password_entropy.append((password, entropy))
+        if ((self.exclude_non_ascii and not is_ascii_printable(password))
+                or len(password) < self.min_length or len(password) > self.max_length
+                or (self.pattern_matcher and not self.pattern_matcher.match(password))):
+            self.filtered_passwords += weight
+            # the classic table covers every line, so keep the characters of
+            # filtered lines too; valid ones are already in position_character_counters
+            for position, char in enumerate(password[:self.max_length]):
+                self.filtered_position_counters[position][char] += weight
+            return
         
-        for position, char in enumerate(password):
-            if position < self.max_length:
-                self.position_character_counters[position][char] += 1
-                
-                char_category = get_char_category(char)
-                self.position_type_counters[position][char_category] += 1
-                
-                if position < len(password) - 1:
-                    next_char = password[position + 1]
-                    self.followers[char][next_char] += 1
-                    self.position_followers[position][char][next_char] += 1
+        self.valid_passwords += weight
+        self.length_distribution[len(password)] += weight
+        if self.dedup:
+            self.unique_valid += 1
+            self.unique_length_distribution[len(password)] += 1
+        self._analyze_password(password, weight)
+        
+        if self.enhanced:
+            self._enhanced_analysis(password, weight)
+    
+    def _analyze_parallel(self, shards, task=_analyze_range):
+        if self.profiler:
+            self.profiler.sample(0)
+        with multiprocessing.Pool(self.workers, initializer=_init_worker, initargs=(self.config, self.word_matcher)) as pool:
+            # imap keeps shard order, so merged Counters see keys in the same
+            # order as a sequential scan and ties in most_common() stay stable
+            for shard, state in enumerate(pool.imap(task, shards), 1):
+                self.merge_state(state)
+                if self.profiler:
+                    self.profiler.sample(self.total_passwords)
+                if self.verbose:
+                    print(f"Merged shard {shard} ({self.total_passwords} passwords so far)...")
+    
+    def get_state(self):
+        state = {name: _plain_counts(getattr(self, name)) for name in STATE_FIELDS}
+        state['plugins'] = {plugin.name: plugin.get_state() for plugin in self.plugins}
+        return state
+    
+    def merge_state(self, state):
+        for name in STATE_FIELDS:
+            current = getattr(self, name)
+            value = state[name]
+            if isinstance(value, tuple) and not hasattr(current, 'merge_state'):
+                # approximate counters absorb exact ones, never the other way round
+                approx = ApproxCounter(value[1], distinct=value[6] is not None)
+                approx.merge_state(_plain_counts(current))
+                setattr(self, name, approx)
+                current = approx
+            if hasattr(current, 'merge_state'):
+                current.merge_state(value)
+            elif isinstance(current, dict):
+                _merge_counts(current, value)
+            else:
+                setattr(self, name, current + value)
+        
+        for name, plugin_state in state.get('plugins', {}).items():
+            if name not in self.plugin_names:
+                self.plugin_names.append(name)
+                self.plugins.append(ANALYSIS_PLUGINS[name]())
+            self.plugins[self.plugin_names.index(name)].merge_state(plugin_state)
+    
+    def settings(self):
+        return {
+            'max_length': self.max_length, 'min_length': self.min_length,
+            'exclude_non_ascii': self.exclude_non_ascii, 'pattern': self.pattern,
+            'enhanced': self.enhanced, 'approx': self.approx_capacity, 'sample': self.sample_method,
+            'dictionary': os.path.basename(self.dictionary_file) if self.dictionary_file else None
+        }
+    
+    def save_state(self, path):
+        snapshot = {
+            'sources': self.sources or [self.file_path if self.file_path == '-' else os.path.abspath(self.file_path)],
+            'settings': self.settings(),
+            'state': self.get_state()
+        }
+        try:
+            write_state_file(path, snapshot)
+            print(f"{Colors.GREEN}State saved to: {path}{Colors.RESET}")
+        except Exception as e:
+            print(f"{Colors.RED}Error saving state: {e}{Colors.RESET}")
+            sys.exit(1)
+    
+    def load_states(self, paths):
+        settings = None
+        for path in paths:
+            try:
+                snapshot = read_state_file(path)
+            except FileNotFoundError:
+                print(f"{Colors.RED}Error: State file '{path}' not found.{Colors.RESET}")
+                sys.exit(1)
+            except Exception as e:
+                print(f"{Colors.RED}Error loading state file '{path}': {e}{Colors.RESET}")
+                sys.exit(1)
+            
+            if settings is None:
+                settings = dict(snapshot['settings'])
+            elif snapshot['settings'] != settings:
+                print(f"{Colors.YELLOW}Warning: '{path}' was produced with different settings; merged results mix filters.{Colors.RESET}")
+                settings['enhanced'] = settings['enhanced'] and snapshot['settings']['enhanced']
+                settings['approx'] = max(settings.get('approx', 0), snapshot['settings'].get('approx', 0))
+            
+            self.merge_state(snapshot['state'])
+            self.sources.extend(snapshot['sources'])
+        
+        if settings:
+            self.max_length = settings['max_length']
+            self.min_length = settings['min_length']
+            self.exclude_non_ascii = settings['exclude_non_ascii']
+            self.pattern = settings['pattern']
+            self.enhanced = settings['enhanced']
+            self.approx_capacity = settings.get('approx', 0)
+            self.sample_method = settings.get('sample')
+            self.dictionary_file = settings['dictionary']
+        self.file_path = ', '.join(self.sources)
+        
+        print(f"{Colors.GREEN}Loaded {len(paths)} state file(s).{Colors.RESET}")
+        print(f"Total passwords: {self.total_passwords}")
+        print(f"Valid passwords processed: {self.valid_passwords}")
+        print(f"Filtered passwords: {self.filtered_passwords}")
+    
+    def _analyze_password(self, password, weight=1):
+        mask = password_mask(password)
+        self.patterns[mask] += weight
+        if self.dedup:
+            self.unique_patterns[mask] += 1
+        
+        self.entropy_stats.add(password, entropy_from_mask(mask), weight)
         
-        self.character_overall_counter.update(password)
-        self.total_chars += len(password)
+        if self.position_engine:
+            if password.isascii():
+                self.position_engine.add(password[:self.max_length], weight)
+            else:
+                self.position_engine.add_other(password[:self.max_length], weight)
+        else:
+            position_character_counters = self.position_character_counters
+            position_type_counters = self.position_type_counters
+            for position, char in enumerate(password[:self.max_length]):
+                position_character_counters[position][char] += weight
+                position_type_counters[position][MASK_CATEGORIES[mask[position]]] += weight
+            
+            for position, (char, next_char) in enumerate(zip(password[:self.max_length], password[1:])):
+                self.followers[char][next_char] += weight
+                self.position_followers[position][char][next_char] += weight
+        
+        trigrams = [password[i:i+3] for i in range(len(password) - 2)]
+        if weight == 1:
+            self.character_overall_counter.update(password)
+            self.trigram_frequency.update(trigrams)
+        else:
+            for char in password:
+                self.character_overall_counter[char] += weight
+            for trigram in trigrams:
+                self.trigram_frequency[trigram] += weight
+        self.total_chars += len(password) * weight
         
-        has_lower = any(c.islower() for c in password)
-        has_upper = any(c.isupper() for c in password)
-        has_digit = any(c.isdigit() for c in password)
-        has_special = any(c in self.special_chars for c in password)
+        if password.isascii():
+            has_lower = 'l' in mask
+            has_upper = 'L' in mask
+            has_digit = 'd' in mask
+        else:
+            has_lower = any(c.islower() for c in password)
+            has_upper = any(c.isupper() for c in password)
+            has_digit = any(c.isdigit() for c in password)
+        has_special = not SPECIAL_CHARS.isdisjoint(password)
         
         complexity = sum([has_lower, has_upper, has_digit, has_special])
-        self.complexity_distribution[complexity] += 1
-        
-        for i in range(len(password) - 2):
-            trigram = password[i:i+3]
-            self.trigram_frequency[trigram] += 1
-    
-    def _enhanced_analysis(self, password):
-        for i in range(len(password) - 2):
-            if password[i] == password[i+1] == password[i+2]:
-                rep_seq = password[i] * 3
-                j = i + 3
-                while j < len(password) and password[j] == password[i]:
-                    rep_seq += password[i]
-                    j += 1
-                if len(rep_seq) >= 3:
-                    self.repetitive_sequences[rep_seq] += 1
-        
-        keyboard_pattern = detect_keyboard_pattern(password, self.keyboard_layouts)
+        self.complexity_distribution[complexity] += weight
+    
+    def _enhanced_analysis(self, password, weight=1):
+        runs, numeric, date, leet, suffix, special_positions, capitalization = self.feature_scanner(password)
+        
+        for char, run_length in runs:
+            for length in range(run_length, 2, -1):
+                self.repetitive_sequences[char * length] += weight
+        
+        keyboard_pattern = self.keyboard_detector.find(password)
         if keyboard_pattern:
-            self.keyboard_sequences[keyboard_pattern[1]] += 1
+            self.keyboard_sequences[keyboard_pattern[1]] += weight
         
-        for i in range(len(password) - 2):
-            substr = password[i:i+3]
-            if detect_numerical_sequence(substr):
-                self.numeric_sequences += 1
-                break
+        if numeric:
+            self.numeric_sequences += weight
         
-        if detect_date_patterns(password):
-            self.date_patterns[password] += 1
+        if date:
+            self.date_patterns[password] += weight
         
-        if is_leetspeak(password):
-            self.leetspeak_count += 1
+        if leet:
+            self.leetspeak_count += weight
         
-        alpha_prefix = re.match(r'^([a-zA-Z]+)([0-9]+)$', password)
-        if alpha_prefix:
-            prefix, suffix = alpha_prefix.groups()
-            self.number_suffix_patterns[suffix] += 1
+        if suffix:
+            self.number_suffix_patterns[suffix] += weight
         
-        for i, char in enumerate(password):
-            if char in self.special_chars:
-                self.special_char_positions[i] += 1
+        for i in special_positions:
+            self.special_char_positions[i] += weight
         
-        if any(c.isupper() for c in password) and any(c.islower() for c in password):
-            if password[0].isupper() and all(c.islower() for c in password[1:] if c.isalpha()):
-                self.capitalization_patterns['First letter'] += 1
-            elif all(c.isupper() for c in password if c.isalpha()):
-                self.capitalization_patterns['ALL CAPS'] += 1
-            elif password[0].islower() and any(password[i].isupper() and password[i-1].islower() for i in range(1, len(password))):
-                self.capitalization_patterns['camelCase'] += 1
-            else:
-                self.capitalization_patterns['Random'] += 1
-        
-        if self.dictionary_words:
-            password_lower = password.lower()
-            for word in self.dictionary_words:
-                if len(word) >= 4 and word in password_lower:
-                    self.common_words[word] += 1
-                    self.english_words_detected += 1
-                    idx = password_lower.find(word)
-                    if idx > 0:
-                        prefix = password[idx-1]
-                        self.word_boundaries[f"prefix_{prefix}"] += 1
-                    if idx + len(word) < len(password):
-                        suffix = password[idx+len(word)]
-                        self.word_boundaries[f"suffix_{suffix}"] += 1
-        
-        if len(password) > 1:
-            for i in range(1, min(5, len(password))):
-                self.password_pairs[f"{password[:-i]}|{password}"] += 1
-    
-    def _get_pattern_char(self, char):
-        if char in string.ascii_lowercase:
-            return 'l'
-        elif char in string.ascii_uppercase:
-            return 'L'
-        elif char in string.digits:
-            return 'd'
-        else:
-            return 's'
+        if capitalization:
+            self.capitalization_patterns[capitalization] += weight
+        
+        words = None
+        if self.word_matcher:
+            words = self.word_matcher.find(password.lower())
+            for word, idx in words.items():
+                self.common_words[word] += weight
+                self.english_words_detected += weight
+                if idx > 0:
+                    prefix = password[idx-1]
+                    self.word_boundaries[f"prefix_{prefix}"] += weight
+                if idx + len(word) < len(password):
+                    suffix = password[idx+len(word)]
+                    self.word_boundaries[f"suffix_{suffix}"] += weight
+        
+        if self.dedup:
+            for feature, found in (('keyboard', keyboard_pattern), ('numeric', numeric), ('date', date),
+                                   ('leetspeak', leet), ('dictionary', words)):
+                if found:
+                    self.unique_features[feature] += 1
+        
+        self.derivation_bases[password] += weight
+    
+    def _unique_share(self, count):
+        # by-unique-password figure shown next to occurrence counts after --dedup
+        if not self.unique_valid:
+            return ""
+        return f", {count} unique ({self._percent(count, self.unique_valid)})"
+    
+    def _percent(self, count, total):
+        # sampled runs show the 95% Wilson interval next to every percentage
+        percentage = f"{count / total * 100:.2f}%"
+        if not self.sample_method:
+            return percentage
+        low, high = wilson_interval(count, total)
+        return f"{percentage} [{low * 100:.2f}-{high * 100:.2f}%]"
     
     def print_summary(self):
         print(f"\n{Colors.BOLD}{Colors.UNDERLINE}PASSWORD ANALYSIS SUMMARY{Colors.RESET}")
         print(f"\nAnalyzed {self.valid_passwords} passwords from {self.file_path}")
+        if self.approx_capacity:
+            print(f"{Colors.YELLOW}Approximate mode: pattern, sequence, suffix, date and trigram counts keep the top {self.approx_capacity} entries each; counts are upper bounds within the listed overcount.{Colors.RESET}")
+        if self.sample_method:
+            print(f"{Colors.YELLOW}Sampled run ({self.sample_method}): counts are from the sample only; percentages show 95% Wilson confidence intervals in brackets.{Colors.RESET}")
+        if self.unique_valid:
+            print(f"Unique passwords: {self.unique_valid} ({self.valid_passwords / self.unique_valid:.2f} occurrences per unique password)")
         
         if self.valid_passwords > 0:
             avg_length = sum(length * count for length, count in self.length_distribution.items()) / self.valid_passwords
@@ -417,19 +2843,16 @@ class PasswordAnalyzer:
             
             print(f"\n{Colors.BOLD}Most Common Lengths:{Colors.RESET}")
             for length, count in self.length_distribution.most_common(5):
-                percentage = (count / self.valid_passwords) * 100
-                print(f"Length {length}: {count} passwords ({percentage:.2f}%)")
+                print(f"Length {length}: {count} passwords ({self._percent(count, self.valid_passwords)}){self._unique_share(self.unique_length_distribution[length])}")
         
         print(f"\n{Colors.BOLD}Most Common Patterns:{Colors.RESET}")
         for pattern, count in self.patterns.most_common(5):
-            percentage = (count / self.valid_passwords) * 100
-            print(f"Pattern '{pattern}': {count} passwords ({percentage:.2f}%)")
+            bound = f" (overcount <= {self.patterns.error(pattern)})" if isinstance(self.patterns, ApproxCounter) else ""
+            print(f"Pattern '{pattern}': {count} passwords ({self._percent(count, self.valid_passwords)}){self._unique_share(self.unique_patterns[pattern])}{bound}")
             
-        if self.password_entropy:
-            entropies = [e for _, e in self.password_entropy]
-            avg_entropy = sum(entropies) / len(entropies)
-            min_entropy = min(entropies)
-            max_entropy = max(entropies)
+        entropy_summary = self.entropy_stats.summary()
+        if entropy_summary:
+            avg_entropy, min_entropy, max_entropy = entropy_summary
             
             print(f"\n{Colors.BOLD}Password Entropy:{Colors.RESET}")
             print(f"Average entropy: {avg_entropy:.2f} bits")
@@ -449,16 +2872,45 @@ class PasswordAnalyzer:
         }
         
         for complexity, count in sorted(self.complexity_distribution.items()):
-            percentage = (count / self.valid_passwords) * 100
             complexity_table.add_row([
                 complexity, 
                 complexity_desc.get(complexity, "Unknown"), 
                 count, 
-                f"{percentage:.2f}%"
+                self._percent(count, self.valid_passwords)
             ])
         
         print(complexity_table)
     
+    def print_entropy_analysis(self):
+        print(f"\n{Colors.BOLD}{Colors.UNDERLINE}ENTROPY ANALYSIS{Colors.RESET}")
+        
+        percentiles = self.entropy_stats.percentiles()
+        if not percentiles:
+            print("No passwords to analyze.")
+            return
+        
+        print(f"\n{Colors.BOLD}Entropy Percentiles:{Colors.RESET}")
+        percentile_table = PrettyTable()
+        percentile_table.field_names = ["Percentile", "Entropy (bits)"]
+        for point, bits in percentiles:
+            percentile_table.add_row([f"{point}th", bits])
+        print(percentile_table)
+        
+        print(f"\n{Colors.BOLD}Entropy by Length:{Colors.RESET}")
+        length_table = PrettyTable()
+        length_table.field_names = ["Length", "Count", "Average", "Minimum", "Maximum"]
+        for length, count, average, minimum, maximum in self.entropy_stats.by_length():
+            length_table.add_row([length, count, f"{average:.2f}", minimum, maximum])
+        print(length_table)
+        
+        if self.entropy_stats.samples:
+            print(f"\n{Colors.BOLD}Example Passwords by Entropy:{Colors.RESET}")
+            sample_table = PrettyTable()
+            sample_table.field_names = ["Password", "Length", "Entropy (bits)"]
+            for password, (_, bits) in sorted(self.entropy_stats.samples.items(), key=lambda item: (item[1][1], item[0])):
+                sample_table.add_row([password, len(password), bits])
+            print(sample_table)
+    
     def print_character_analysis(self):
         print(f"\n{Colors.BOLD}{Colors.UNDERLINE}CHARACTER ANALYSIS{Colors.RESET}")
         
@@ -510,19 +2962,15 @@ class PasswordAnalyzer:
         for position in range(positions_to_show):
             total = sum(self.position_type_counters[position].values())
             if total > 0:
-                lowercase_pct = (self.position_type_counters[position]['lowercase'] / total) * 100
-                uppercase_pct = (self.position_type_counters[position]['uppercase'] / total) * 100
-                digit_pct = (self.position_type_counters[position]['digit'] / total) * 100
-                special_pct = (self.position_type_counters[position]['special'] / total) * 100
-                
-                most_common_type = max(self.position_type_counters[position].items(), key=lambda x: x[1])[0]
+                types = self.position_type_counters[position]
+                most_common_type = max(types.items(), key=lambda x: x[1])[0]
                 
                 type_table.add_row([
                     position + 1,
-                    f"{lowercase_pct:.2f}%",
-                    f"{uppercase_pct:.2f}%",
-                    f"{digit_pct:.2f}%",
-                    f"{special_pct:.2f}%",
+                    self._percent(types['lowercase'], total),
+                    self._percent(types['uppercase'], total),
+                    self._percent(types['digit'], total),
+                    self._percent(types['special'], total),
                     most_common_type
                 ])
         
@@ -537,8 +2985,7 @@ class PasswordAnalyzer:
                 table.field_names = ["Character", "Count", "Percentage"]
                 
                 for char, count in self.position_character_counters[position].most_common(top_chars):
-                    percentage = (count / total) * 100
-                    table.add_row([char, count, f"{percentage:.2f}%"])
+                    table.add_row([char, count, self._percent(count, total)])
                 
                 print(table)
     
@@ -584,12 +3031,12 @@ class PasswordAnalyzer:
         if self.trigram_frequency:
             print(f"\n{Colors.BOLD}Most Common 3-Character Sequences:{Colors.RESET}")
             trigram_table = PrettyTable()
-            trigram_table.field_names = ["Trigram", "Count", "Percentage"]
+            trigram_table.field_names = ["Trigram", "Count", "Percentage"] + overcount_columns(self.trigram_frequency)
             
-            total_trigrams = sum(self.trigram_frequency.values())
+            total_trigrams = counter_total(self.trigram_frequency)
             for trigram, count in self.trigram_frequency.most_common(10):
                 percentage = (count / total_trigrams) * 100
-                trigram_table.add_row([trigram, count, f"{percentage:.2f}%"])
+                trigram_table.add_row([trigram, count, f"{percentage:.2f}%"] + overcount_cells(self.trigram_frequency, trigram))
             
             print(trigram_table)
     
@@ -602,11 +3049,10 @@ class PasswordAnalyzer:
         if self.repetitive_sequences:
             print(f"\n{Colors.BOLD}Repetitive Character Sequences:{Colors.RESET}")
             rep_table = PrettyTable()
-            rep_table.field_names = ["Sequence", "Count", "Percentage"]
+            rep_table.field_names = ["Sequence", "Count", "Percentage"] + overcount_columns(self.repetitive_sequences)
             
             for seq, count in self.repetitive_sequences.most_common(10):
-                percentage = (count / self.valid_passwords) * 100
-                rep_table.add_row([seq, count, f"{percentage:.2f}%"])
+                rep_table.add_row([seq, count, self._percent(count, self.valid_passwords)] + overcount_cells(self.repetitive_sequences, seq))
             
             print(rep_table)
         
@@ -616,22 +3062,19 @@ class PasswordAnalyzer:
             key_table.field_names = ["Sequence", "Count", "Percentage"]
             
             for seq, count in self.keyboard_sequences.most_common(10):
-                percentage = (count / self.valid_passwords) * 100
-                key_table.add_row([seq, count, f"{percentage:.2f}%"])
+                key_table.add_row([seq, count, self._percent(count, self.valid_passwords)])
             
             print(key_table)
             
         print(f"\n{Colors.BOLD}Date Pattern Detection:{Colors.RESET}")
-        date_percentage = (len(self.date_patterns) / self.valid_passwords) * 100
-        print(f"Passwords containing date patterns: {len(self.date_patterns)} ({date_percentage:.2f}%)")
+        estimate = "~" if isinstance(self.date_patterns, ApproxCounter) else ""
+        print(f"Passwords containing date patterns: {estimate}{len(self.date_patterns)} ({self._percent(len(self.date_patterns), self.valid_passwords)}){self._unique_share(self.unique_features['date'])}")
         
         print(f"\n{Colors.BOLD}Numeric Sequence Detection:{Colors.RESET}")
-        num_seq_percentage = (self.numeric_sequences / self.valid_passwords) * 100
-        print(f"Passwords containing numeric sequences: {self.numeric_sequences} ({num_seq_percentage:.2f}%)")
+        print(f"Passwords containing numeric sequences: {self.numeric_sequences} ({self._percent(self.numeric_sequences, self.valid_passwords)}){self._unique_share(self.unique_features['numeric'])}")
         
         print(f"\n{Colors.BOLD}Leetspeak Usage:{Colors.RESET}")
-        leetspeak_percentage = (self.leetspeak_count / self.valid_passwords) * 100
-        print(f"Passwords using leetspeak: {self.leetspeak_count} ({leetspeak_percentage:.2f}%)")
+        print(f"Passwords using leetspeak: {self.leetspeak_count} ({self._percent(self.leetspeak_count, self.valid_passwords)}){self._unique_share(self.unique_features['leetspeak'])}")
         
         if self.capitalization_patterns:
             print(f"\n{Colors.BOLD}Capitalization Patterns:{Colors.RESET}")
@@ -640,22 +3083,37 @@ class PasswordAnalyzer:
             
             cap_passwords = sum(self.capitalization_patterns.values())
             for pattern, count in self.capitalization_patterns.most_common():
-                percentage = (count / cap_passwords) * 100
-                cap_table.add_row([pattern, count, f"{percentage:.2f}%"])
+                cap_table.add_row([pattern, count, self._percent(count, cap_passwords)])
             
             print(cap_table)
         
         if self.number_suffix_patterns:
             print(f"\n{Colors.BOLD}Number Suffix Patterns:{Colors.RESET}")
             suffix_table = PrettyTable()
-            suffix_table.field_names = ["Suffix", "Count", "Percentage"]
+            suffix_table.field_names = ["Suffix", "Count", "Percentage"] + overcount_columns(self.number_suffix_patterns)
             
             for suffix, count in self.number_suffix_patterns.most_common(10):
-                percentage = (count / self.valid_passwords) * 100
-                suffix_table.add_row([suffix, count, f"{percentage:.2f}%"])
+                suffix_table.add_row([suffix, count, self._percent(count, self.valid_passwords)] + overcount_cells(self.number_suffix_patterns, suffix))
             
             print(suffix_table)
         
+        derivations = find_derivations(self.derivation_bases)
+        if derivations:
+            print(f"\n{Colors.BOLD}Password Derivations (base -> base + appended characters):{Colors.RESET}")
+            appended = appended_counts(derivations)
+            
+            appended_table = PrettyTable()
+            appended_table.field_names = ["Appended", "Derived Passwords", "Percentage"]
+            for chars, count in appended.most_common(10):
+                appended_table.add_row([chars, count, self._percent(count, self.valid_passwords)])
+            print(appended_table)
+            
+            pair_table = PrettyTable()
+            pair_table.field_names = ["Base", "Derived", "Base Count", "Derived Count"]
+            for base, derived, base_count, count in derivations[:10]:
+                pair_table.add_row([base, derived, base_count, count])
+            print(pair_table)
+        
         if self.special_char_positions:
             print(f"\n{Colors.BOLD}Special Character Positions:{Colors.RESET}")
             special_pos_table = PrettyTable()
@@ -664,21 +3122,19 @@ class PasswordAnalyzer:
             total_special = sum(self.special_char_positions.values())
             if total_special > 0:
                 for position, count in sorted(self.special_char_positions.items()):
-                    percentage = (count / total_special) * 100
-                    special_pos_table.add_row([position + 1, count, f"{percentage:.2f}%"])
+                    special_pos_table.add_row([position + 1, count, self._percent(count, total_special)])
                 
                 print(special_pos_table)
         
-        if self.dictionary_words and self.common_words:
+        if self.common_words:
             print(f"\n{Colors.BOLD}Common Dictionary Words in Passwords:{Colors.RESET}")
-            print(f"Passwords containing English dictionary words: {self.english_words_detected} ({(self.english_words_detected/self.valid_passwords)*100:.2f}%)")
+            print(f"Passwords containing English dictionary words: {self.english_words_detected} ({self._percent(self.english_words_detected, self.valid_passwords)})")
             
             word_table = PrettyTable()
             word_table.field_names = ["Word", "Count", "Percentage"]
             
             for word, count in self.common_words.most_common(15):
-                percentage = (count / self.valid_passwords) * 100
-                word_table.add_row([word, count, f"{percentage:.2f}%"])
+                word_table.add_row([word, count, self._percent(count, self.valid_passwords)])
             
             print(word_table)
             
@@ -697,9 +3153,154 @@ class PasswordAnalyzer:
     
     def print_classic_analysis(self):
         print(f"\n{Colors.BOLD}{Colors.UNDERLINE}CLASSIC TYPE ANALYSIS{Colors.RESET}")
-        positionCounters, charAnalysisResult = analyzePasswordsFromFile(self.file_path, self.max_length)
+        # Built from the counters of the main pass, so the input is never read twice
+        line_counts = defaultdict(Counter)
+        _merge_counts(line_counts, self.position_character_counters)
+        _merge_counts(line_counts, self.filtered_position_counters)
+        positionCounters, charAnalysisResult = classicTablesFromCounts(line_counts, self.max_length)
         printAnalysisResults(positionCounters, charAnalysisResult, self.max_length)
     
+    def print_plugin_reports(self):
+        for plugin in self.plugins:
+            print(f"\n{Colors.BOLD}{Colors.UNDERLINE}{plugin.title}{Colors.RESET}")
+            plugin.report()
+    
+    def _sqlite_features(self):
+        # enhanced detectors as (feature, key, count); totals use an empty key
+        yield 'numeric_sequences', '', self.numeric_sequences
+        yield 'leetspeak', '', self.leetspeak_count
+        yield 'english_words', '', self.english_words_detected
+        for feature, counter in (('repetitive_sequence', self.repetitive_sequences), ('keyboard_walk', self.keyboard_sequences),
+                                 ('date', self.date_patterns), ('dictionary_word', self.common_words),
+                                 ('capitalization', self.capitalization_patterns), ('word_boundary', self.word_boundaries),
+                                 ('number_suffix', self.number_suffix_patterns)):
+            for key, count in counter.items():
+                yield feature, key, count
+        for position, count in self.special_char_positions.items():
+            yield 'special_position', str(position + 1), count
+        for feature, count in self.unique_features.items():
+            yield 'unique', feature, count
+    
+    def export_hcmask(self, path, coverage=0.9, max_keyspace=None):
+        rows = generate_hcmasks(self.patterns, self.position_character_counters, self.valid_passwords, coverage, max_keyspace)
+        try:
+            with open(path, 'w', encoding='utf-8', newline='\n') as f:
+                for line, _, _, _ in rows:
+                    f.write(line + '\n')
+        except OSError as e:
+            print(f"{Colors.RED}Error writing mask file: {e}{Colors.RESET}")
+            sys.exit(1)
+        
+        covered = sum(row[2] for row in rows)
+        keyspace = sum(row[3] for row in rows)
+        print(f"\n{Colors.BOLD}Hashcat Masks:{Colors.RESET}")
+        print(f"Wrote {len(rows)} masks to {path}: {covered} of {self.valid_passwords} passwords "
+              f"({covered / self.valid_passwords * 100 if self.valid_passwords else 0:.2f}%) in a keyspace of {keyspace:.3g}")
+        table = PrettyTable()
+        table.field_names = ["Mask", "Pattern", "Hits", "Keyspace", "Hits per Billion", "Coverage"]
+        table.align["Mask"] = "l"
+        running = 0
+        for line, pattern, hits, size in rows[:10]:
+            running += hits
+            table.add_row([line, pattern, hits, f"{size:.3g}", f"{hits / size * 1e9:.3g}", f"{running / self.valid_passwords * 100:.2f}%"])
+        print(table)
+    
+    def export_markov(self, path):
+        plugin = next((plugin for plugin in self.plugins if plugin.name == 'markov-length'), None)
+        model = MarkovModel.build(self.position_character_counters, self.position_followers, self.length_distribution,
+                                  plugin.length_transitions if plugin else None, self.character_overall_counter)
+        try:
+            model.save(path)
+        except OSError as e:
+            print(f"{Colors.RED}Error writing Markov model: {e}{Colors.RESET}")
+            sys.exit(1)
+        by_length = f", {len(model.lengths) - 1} per-length tables" if len(model.lengths) > 1 else ''
+        print(f"{Colors.GREEN}Markov model written to: {path} ({len(model.alphabet)} characters, "
+              f"{model.positions} positions{by_length}, {os.path.getsize(path) / 2**20:.1f} MB){Colors.RESET}")
+    
+    def export_hcstat2(self, path):
+        try:
+            write_hcstat2(path, self.position_character_counters, self.position_followers)
+        except OSError as e:
+            print(f"{Colors.RED}Error writing hcstat2 file: {e}{Colors.RESET}")
+            sys.exit(1)
+        print(f"{Colors.GREEN}Hashcat Markov statistics written to: {path}{Colors.RESET}")
+    
+    def export_pcfg(self, path):
+        plugin = next((plugin for plugin in self.plugins if plugin.name == 'pcfg'), None)
+        if plugin is None or not plugin.structures:
+            print(f"{Colors.RED}Error: no PCFG counts; analyze with --plugin pcfg (or load a state saved with it).{Colors.RESET}")
+            sys.exit(1)
+        grammar = plugin.grammar()
+        try:
+            write_grammar_file(path, grammar)
+        except OSError as e:
+            print(f"{Colors.RED}Error writing grammar: {e}{Colors.RESET}")
+            sys.exit(1)
+        print(f"{Colors.GREEN}PCFG grammar written to: {path} ({len(grammar['structures'])} base structures, "
+              f"{len(grammar['slots'])} slots, {os.path.getsize(path) / 2**20:.1f} MB){Colors.RESET}")
+    
+    def export_sqlite(self, path):
+        source = ', '.join(self.sources) if self.sources else (self.file_path if self.file_path == '-' else os.path.abspath(self.file_path))
+        try:
+            connection = sqlite3.connect(path)
+            connection.executescript(SQLITE_SCHEMA)
+            # a single transaction: re-exporting a source replaces its rows atomically
+            with connection:
+                row = connection.execute("SELECT id FROM runs WHERE source = ?", (source,)).fetchone()
+                if row:
+                    for table in SQLITE_TABLES:
+                        connection.execute(f"DELETE FROM {table} WHERE run_id = ?", row)
+                    connection.execute("DELETE FROM runs WHERE id = ?", row)
+                
+                run = connection.execute(
+                    "INSERT INTO runs (source, exported, total_passwords, valid_passwords, filtered_passwords, unique_passwords, settings) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (source, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), self.total_passwords, self.valid_passwords,
+                     self.filtered_passwords, self.unique_passwords or None, json.dumps(self.settings()))
+                ).lastrowid
+                unique = bool(self.unique_valid)
+                
+                connection.executemany("INSERT INTO lengths VALUES (?, ?, ?, ?)", (
+                    (run, length, count, self.unique_length_distribution[length] if unique else None)
+                    for length, count in self.length_distribution.items()))
+                connection.executemany("INSERT INTO masks VALUES (?, ?, ?, ?, ?)", (
+                    (run, mask, len(mask), count, self.unique_patterns[mask] if unique else None)
+                    for mask, count in self.patterns.items()))
+                connection.executemany("INSERT INTO complexity VALUES (?, ?, ?)", (
+                    (run, level, count) for level, count in self.complexity_distribution.items()))
+                connection.executemany("INSERT INTO entropy VALUES (?, ?, ?, ?)", (
+                    (run, length, bits, count)
+                    for length, counter in self.entropy_stats.histogram.items() for bits, count in counter.items()))
+                connection.executemany("INSERT INTO characters VALUES (?, ?, ?)", (
+                    (run, char, count) for char, count in self.character_overall_counter.items()))
+                connection.executemany("INSERT INTO positions VALUES (?, ?, ?, ?)", (
+                    (run, position + 1, char, count)
+                    for position, counter in self.position_character_counters.items() for char, count in counter.items()))
+                connection.executemany("INSERT INTO position_types VALUES (?, ?, ?, ?)", (
+                    (run, position + 1, kind, count)
+                    for position, counter in self.position_type_counters.items() for kind, count in counter.items()))
+                connection.executemany("INSERT INTO followers VALUES (?, ?, ?, ?)", (
+                    (run, char, follower, count)
+                    for char, counter in self.followers.items() for follower, count in counter.items()))
+                connection.executemany("INSERT INTO position_followers VALUES (?, ?, ?, ?, ?)", (
+                    (run, position + 1, char, follower, count)
+                    for position, followers in self.position_followers.items()
+                    for char, counter in followers.items() for follower, count in counter.items()))
+                connection.executemany("INSERT INTO trigrams VALUES (?, ?, ?)", (
+                    (run, trigram, count) for trigram, count in self.trigram_frequency.items()))
+                if self.enhanced:
+                    connection.executemany("INSERT INTO features VALUES (?, ?, ?, ?)", (
+                        (run, feature, key, count) for feature, key, count in self._sqlite_features()))
+                    connection.executemany("INSERT INTO derivations VALUES (?, ?, ?, ?, ?)", (
+                        (run, base, derived[len(base):], base_count, count)
+                        for base, derived, base_count, count in find_derivations(self.derivation_bases)))
+            connection.close()
+            print(f"{Colors.GREEN}Results exported to SQLite database: {path}{Colors.RESET}")
+        except (sqlite3.Error, OSError) as e:
+            print(f"{Colors.RED}Error exporting to SQLite: {e}{Colors.RESET}")
+            sys.exit(1)
+    
     def export_results(self):
         if not self.output_dir:
             return
@@ -714,12 +3315,16 @@ class PasswordAnalyzer:
                 f.write(f"Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
                 f.write(f"Total passwords: {self.total_passwords}\n")
                 f.write(f"Valid passwords: {self.valid_passwords}\n")
-                f.write(f"Filtered passwords: {self.filtered_passwords}\n\n")
+                f.write(f"Filtered passwords: {self.filtered_passwords}\n")
+                if self.unique_passwords:
+                    f.write(f"Unique passwords: {self.unique_passwords}\n")
+                    f.write(f"Unique valid passwords: {self.unique_valid}\n")
+                f.write("\n")
                 
                 f.write("Length Distribution:\n")
                 for length, count in sorted(self.length_distribution.items()):
                     percentage = (count / self.valid_passwords) * 100
-                    f.write(f"Length {length}: {count} ({percentage:.2f}%)\n")
+                    f.write(f"Length {length}: {count} ({percentage:.2f}%){self._unique_share(self.unique_length_distribution[length])}\n")
             
             with open(os.path.join(self.output_dir, f'character_frequency_{timestamp}.csv'), 'w') as f:
                 f.write("Character,Count,Percentage\n")
@@ -740,12 +3345,20 @@ class PasswordAnalyzer:
                             f.write(f"{position+1},{char_escaped},{count},{percentage:.4f}\n")
             
             with open(os.path.join(self.output_dir, f'patterns_{timestamp}.csv'), 'w') as f:
-                f.write("Pattern,Count,Percentage\n")
+                approx = isinstance(self.patterns, ApproxCounter)
+                f.write("Pattern,Count,Percentage" + (",UniqueCount" if self.unique_valid else "") + (",MaxOvercount\n" if approx else "\n"))
                 for pattern, count in self.patterns.most_common():
                     percentage = (count / self.valid_passwords) * 100
-                    f.write(f"{pattern},{count},{percentage:.4f}\n")
+                    unique = f",{self.unique_patterns[pattern]}" if self.unique_valid else ""
+                    f.write(f"{pattern},{count},{percentage:.4f}{unique}" + (f",{self.patterns.error(pattern)}\n" if approx else "\n"))
             
             if self.enhanced:
+                with open(os.path.join(self.output_dir, f'derivations_{timestamp}.csv'), 'w', newline='') as f:
+                    writer = csv.writer(f)
+                    writer.writerow(["Base", "Derived", "Appended", "BaseCount", "DerivedCount"])
+                    for base, derived, base_count, count in find_derivations(self.derivation_bases):
+                        writer.writerow([base, derived, derived[len(base):], base_count, count])
+                
                 enhanced_data = {
                     "repetitive_sequences": dict(self.repetitive_sequences.most_common(20)),
                     "keyboard_sequences": dict(self.keyboard_sequences.most_common(20)),
@@ -758,6 +3371,14 @@ class PasswordAnalyzer:
                     "common_words": dict(self.common_words.most_common(50)),
                     "trigram_frequency": dict(self.trigram_frequency.most_common(50))
                 }
+                if self.unique_valid:
+                    enhanced_data["unique_passwords"] = dict(self.unique_features, valid=self.unique_valid)
+                if self.approx_capacity:
+                    enhanced_data["max_overcount"] = {
+                        name: {key: counter.error(key) for key in enhanced_data[name]}
+                        for name in ("repetitive_sequences", "number_suffix_patterns", "trigram_frequency")
+                        for counter in [getattr(self, name)] if isinstance(counter, ApproxCounter)
+                    }
                 
                 with open(os.path.join(self.output_dir, f'enhanced_analysis_{timestamp}.json'), 'w') as f:
                     json.dump(enhanced_data, f, indent=2)
@@ -767,21 +3388,289 @@ class PasswordAnalyzer:
         except Exception as e:
             print(f"{Colors.RED}Error exporting results: {e}{Colors.RESET}")
 
-def analyzePasswordsDetailed(file_path):
-    position_character_counters = defaultdict(lambda: defaultdict(int))
-    total_passwords = 0
+ANALYSIS_PLUGINS = {}
+
+def register_plugin(cls):
+    ANALYSIS_PLUGINS[cls.name] = cls
+    return cls
+
+class AnalysisPlugin(ABC):
+    # A plugin sees every stripped input line through update(); get_state()
+    # and merge_state() let shards and saved states be combined like the
+    # main counters, and report() prints the result
+    name = None
+    title = None
+    fields = ()
+    
+    @abstractmethod
+    def update(self, password, weight=1):
+        pass
+    
+    @abstractmethod
+    def report(self):
+        pass
     
-    max_password_length = 32
+    def get_state(self):
+        return {name: _plain_counts(getattr(self, name)) for name in self.fields}
     
-    with open(file_path, 'r', errors='ignore') as file:
-        for line in file:
-            password = line.strip()
-            if len(password) <= max_password_length:
-                total_passwords += 1
-                for position, char in enumerate(password):
-                    position_character_counters[position][char] += 1
+    def merge_state(self, state):
+        for name in self.fields:
+            current = getattr(self, name)
+            if isinstance(current, dict):
+                _merge_counts(current, state[name])
+            else:
+                setattr(self, name, current + state[name])
+
+def create_plugins(names):
+    return [ANALYSIS_PLUGINS[name]() for name in names]
+
+def run_plugins(file_path, plugins):
+    plugins = [ANALYSIS_PLUGINS[plugin]() if isinstance(plugin, str) else plugin for plugin in plugins]
+    updates = [plugin.update for plugin in plugins]
+    for line in iter_file_lines(file_path):
+        password = line.strip()
+        for update in updates:
+            update(password)
+    return plugins
+
+@register_plugin
+class DetailedPositionPlugin(AnalysisPlugin):
+    name = 'detailed'
+    title = 'DETAILED POSITION ANALYSIS'
+    fields = ('position_character_counters', 'total_passwords')
+    
+    def __init__(self, max_length=32):
+        self.max_length = max_length
+        self.position_character_counters = defaultdict(lambda: defaultdict(int))
+        self.total_passwords = 0
+    
+    def update(self, password, weight=1):
+        if len(password) <= self.max_length:
+            self.total_passwords += weight
+            counters = self.position_character_counters
+            for position, char in enumerate(password):
+                counters[position][char] += weight
+    
+    def report(self):
+        printDetailedStats(self.position_character_counters, self.total_passwords)
+
+@register_plugin
+class TopCharacterPlugin(AnalysisPlugin):
+    name = 'top-chars'
+    title = 'MOST COMMON CHARACTER BY POSITION'
+    fields = ('position_counters', 'total_passwords')
+    
+    def __init__(self, max_length=32):
+        self.max_length = max_length
+        self.position_counters = defaultdict(Counter)
+        self.total_passwords = 0
+    
+    def update(self, password, weight=1):
+        if len(password) <= self.max_length:
+            self.total_passwords += weight
+            counters = self.position_counters
+            for position, char in enumerate(password.lower()):
+                counters[position][char] += weight
+    
+    def report(self):
+        for position, counter in sorted(self.position_counters.items()):
+            most_common_char, count = counter.most_common(1)[0]
+            print(f"Position {position + 1}: Most common character is '{most_common_char}' with {count} appearances ({(count / self.total_passwords) * 100:.2f}% of passwords).")
+
+@register_plugin
+class CharacterFrequencyPlugin(AnalysisPlugin):
+    name = 'frequency'
+    title = 'CHARACTER FREQUENCY'
+    fields = ('character_counter', 'total_characters')
+    
+    def __init__(self):
+        self.character_counter = Counter()
+        self.total_characters = 0
+    
+    def update(self, password, weight=1):
+        if weight == 1:
+            self.character_counter.update(password)
+        else:
+            for char in password:
+                self.character_counter[char] += weight
+        self.total_characters += len(password) * weight
+    
+    def sorted_characters(self):
+        character_percentages = {char: (count / self.total_characters) * 100 for char, count in self.character_counter.items()}
+        return sorted(character_percentages.items(), key=lambda item: item[1], reverse=True)
+    
+    def report(self):
+        printCharacterFrequencies(self.sorted_characters())
+
+@register_plugin
+class NextCharacterPlugin(AnalysisPlugin):
+    name = 'next'
+    title = 'MOST COMMON NEXT CHARACTER'
+    fields = ('followers', 'char_occurrences', 'total_passwords', 'filtered_passwords')
+    
+    def __init__(self):
+        self.followers = defaultdict(Counter)
+        self.char_occurrences = defaultdict(int)
+        self.total_passwords = 0
+        self.filtered_passwords = 0
+    
+    def update(self, password, weight=1):
+        self.total_passwords += weight
+        if not isAsciiPrintable(password):
+            self.filtered_passwords += weight
+            return
+        followers = self.followers
+        char_occurrences = self.char_occurrences
+        for current_char, next_char in zip(password, password[1:]):
+            followers[current_char][next_char] += weight
+            char_occurrences[current_char] += weight
+    
+    def report(self):
+        print(f"Total passwords processed: {self.total_passwords}")
+        print(f"Passwords filtered out (non-ASCII printable): {self.filtered_passwords}")
+        for char, counter in self.followers.items():
+            if counter:
+                mostCommonFollower, occurrences = counter.most_common(1)[0]
+                percentage = (occurrences / self.char_occurrences[char]) * 100
+                print(f"Character '{char}' most often followed by: '{mostCommonFollower}' (Occurrences: {occurrences}, {percentage:.2f}%)")
+            else:
+                print(f"Character '{char}' is not followed by any character.")
+
+@register_plugin
+class PositionNextCharacterPlugin(AnalysisPlugin):
+    name = 'next-each'
+    title = 'MOST COMMON NEXT CHARACTER BY POSITION'
+    fields = ('position_followers', 'total_followers')
+    
+    def __init__(self, max_length=16):
+        self.max_length = max_length
+        self.position_followers = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+        self.total_followers = defaultdict(lambda: defaultdict(int))
+    
+    def update(self, password, weight=1):
+        position_followers = self.position_followers
+        total_followers = self.total_followers
+        for i, (current_char, next_char) in enumerate(zip(password[:self.max_length], password[1:])):
+            position_followers[i][current_char][next_char] += weight
+            total_followers[i][current_char] += weight
+    
+    def report(self):
+        for position in range(self.max_length - 1):
+            print(f"\nPosition {position + 1}:")
+            results = []
+            for char, followers in self.position_followers[position].items():
+                if followers:
+                    mostCommonFollower, occurrences = max(followers.items(), key=lambda item: item[1])
+                    percentage = (occurrences / self.total_followers[position][char]) * 100
+                    results.append((char, mostCommonFollower, occurrences, percentage))
+            
+            sortedResults = sorted(results, key=lambda x: x[2], reverse=True)
+            for char, mostCommonFollower, occurrences, percentage in sortedResults:
+                print(f"  Character '{char}' most often followed by '{mostCommonFollower}' (Occurrences: {occurrences}, {percentage:.2f}%)")
+
+@register_plugin
+class CharacterTypePlugin(AnalysisPlugin):
+    name = 'types'
+    title = 'CHARACTER TYPES BY POSITION'
+    fields = ('char_counts',)
+    
+    def __init__(self, max_length=20):
+        self.max_length = max_length
+        self.char_counts = defaultdict(Counter)
+    
+    def update(self, password, weight=1):
+        char_counts = self.char_counts
+        for i, char in enumerate(password[:self.max_length]):
+            char_counts[i][char] += weight
+    
+    def tables(self):
+        return classicTablesFromCounts(self.char_counts, self.max_length)
+    
+    def report(self):
+        positionCounters, charAnalysisResult = self.tables()
+        printAnalysisResults(positionCounters, charAnalysisResult, self.max_length, specialsInLeastCommon=False)
+
+@register_plugin
+class LengthMarkovPlugin(AnalysisPlugin):
+    name = 'markov-length'
+    title = 'MARKOV TRANSITIONS BY LENGTH'
+    fields = ('length_transitions',)
+    
+    def __init__(self, max_length=32):
+        self.max_length = max_length
+        # length -> (position, char, next char or '' at the end) -> count
+        self.length_transitions = defaultdict(Counter)
+    
+    def update(self, password, weight=1):
+        if password and len(password) <= self.max_length:
+            transitions = self.length_transitions[len(password)]
+            for position, char in enumerate(password):
+                transitions[position, char, password[position + 1:position + 2]] += weight
+    
+    def report(self):
+        table = PrettyTable()
+        table.field_names = ["Length", "Passwords", "Transitions", "Most Common Start"]
+        for length, transitions in sorted(self.length_transitions.items()):
+            starts = Counter()
+            for (position, char, _), count in transitions.items():
+                if position == 0:
+                    starts[char] += count
+            char, count = starts.most_common(1)[0]
+            table.add_row([length, sum(starts.values()), sum(1 for key in transitions if key[2]), f"'{char}' ({count})"])
+        print(table)
+
+@register_plugin
+class PcfgPlugin(AnalysisPlugin):
+    name = 'pcfg'
+    title = 'PCFG GRAMMAR'
+    fields = ('structures', 'terminals', 'capitalization', 'total_passwords')
+    
+    def __init__(self, max_length=32):
+        self.max_length = max_length
+        # 'L4D2S1' -> count; 'L4' -> lowercase word, 'D2'/'S1' -> terminal; 'L4' -> 'ULLL'
+        self.structures = Counter()
+        self.terminals = defaultdict(Counter)
+        self.capitalization = defaultdict(Counter)
+        self.total_passwords = 0
+    
+    def update(self, password, weight=1):
+        if not password or len(password) > self.max_length:
+            return
+        self.total_passwords += weight
+        structure = []
+        for kind, chars in itertools.groupby(password, pcfg_class):
+            segment = ''.join(chars)
+            slot = f'{kind}{len(segment)}'
+            structure.append(slot)
+            if kind == 'L':
+                word = segment.lower()
+                # a few letters lower to two characters, e.g. 'İ'
+                if len(word) != len(segment):
+                    word = segment
+                self.terminals[slot][word] += weight
+                self.capitalization[slot][capitalization_mask(segment)] += weight
+            else:
+                self.terminals[slot][segment] += weight
+        self.structures[''.join(structure)] += weight
     
-    return position_character_counters, total_passwords
+    def grammar(self):
+        return compile_pcfg(self.structures, self.terminals, self.capitalization)
+    
+    def report(self):
+        print(f"Passwords: {self.total_passwords}, base structures: {len(self.structures)}, "
+              f"terminal slots: {len(self.terminals)}")
+        table = PrettyTable()
+        table.field_names = ["Base Structure", "Count", "Percentage", "Top Terminal per Segment"]
+        table.align["Top Terminal per Segment"] = "l"
+        for structure, count in self.structures.most_common(10):
+            slots = re.findall(r'[LDS]\d+', structure)
+            terminals = ' '.join(self.terminals[slot].most_common(1)[0][0] for slot in slots)
+            table.add_row([structure, count, f"{count / self.total_passwords * 100:.2f}%", terminals])
+        print(table)
+
+def analyzePasswordsDetailed(file_path):
+    plugin = run_plugins(file_path, ['detailed'])[0]
+    return plugin.position_character_counters, plugin.total_passwords
 
 def printDetailedStats(position_character_counters, total_passwords):
     for position, character_counter in position_character_counters.items():
@@ -798,36 +3687,10 @@ def printDetailedStats(position_character_counters, total_passwords):
         print(table)
 
 def analyzePasswords(file_path):
-    position_counters = defaultdict(Counter)
-    total_passwords = 0
-    max_password_length = 32
-    
-    with open(file_path, 'r', errors='ignore') as file:
-        for line in file:
-            password = line.strip().lower()
-            if len(password) <= max_password_length:
-                total_passwords += 1
-                for position, char in enumerate(password):
-                    position_counters[position][char] += 1
-    
-    for position, counter in sorted(position_counters.items()):
-        if position > max_password_length:
-            break
-        most_common_char, count = counter.most_common(1)[0]
-        print(f"Position {position + 1}: Most common character is '{most_common_char}' with {count} appearances ({(count / total_passwords) * 100:.2f}% of passwords).")
+    run_plugins(file_path, ['top-chars'])[0].report()
 
 def analyzeCharacterFrequency(file_path):
-    character_counter = Counter()
-    total_characters = 0
-    with open(file_path, 'r', errors='ignore') as file:
-        for line in file:
-            password = line.strip()
-            character_counter.update(password)
-            total_characters += len(password)
-    
-    character_percentages = {char: (count / total_characters) * 100 for char, count in character_counter.items()}
-    sorted_characters = sorted(character_percentages.items(), key=lambda item: item[1], reverse=True)
-    return sorted_characters
+    return run_plugins(file_path, ['frequency'])[0].sorted_characters()
 
 def printCharacterFrequencies(sorted_characters, columns=4):
     print("Characters sorted by how common they occurred (highest to lowest percentage):")
@@ -842,67 +3705,419 @@ def printCharacterFrequencies(sorted_characters, columns=4):
         print(output)
 
 def isAsciiPrintable(s):
-    return all(32 <= ord(c) <= 126 for c in s)
+    return s.isascii() and s.isprintable()
 
 def analyzePasswordsNext(file_path):
-    followers = defaultdict(Counter)
-    charOccurrences = defaultdict(int)
-    totalPasswords, filteredPasswords = 0, 0
-    
-    with open(file_path, 'r', encoding='utf-8', errors='ignore') as file:
-        for line in file:
-            totalPasswords += 1
-            password = line.strip()
-            if not isAsciiPrintable(password):
-                filteredPasswords += 1
-                continue
-            for i in range(len(password) - 1):
-                currentChar = password[i]
-                nextChar = password[i + 1]
-                followers[currentChar].update([nextChar])
-                charOccurrences[currentChar] += 1
-    
-    print(f"Total passwords processed: {totalPasswords}")
-    print(f"Passwords filtered out (non-ASCII printable): {filteredPasswords}")
-    for char, counter in followers.items():
-        if counter:
-            mostCommonFollower, occurrences = counter.most_common(1)[0]
-            percentage = (occurrences / charOccurrences[char]) * 100
-            print(f"Character '{char}' most often followed by: '{mostCommonFollower}' (Occurrences: {occurrences}, {percentage:.2f}%)")
-        else:
-            print(f"Character '{char}' is not followed by any character.")
+    run_plugins(file_path, ['next'])[0].report()
 
 def analyzePasswordsNextEach(filePath, maxLength=16):
-    positionFollowers = defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
-    totalFollowers = defaultdict(lambda: defaultdict(int))
-    
-    with open(filePath, 'r', encoding='utf-8', errors='ignore') as file:
-        for line in file:
-            password = line.strip()
-            for i in range(min(len(password) - 1, maxLength - 1)):
-                currentChar = password[i]
-                nextChar = password[i + 1]
-                positionFollowers[i][currentChar][nextChar] += 1
-                totalFollowers[i][currentChar] += 1
-    
-    for position in range(maxLength - 1):
-        print(f"\nPosition {position + 1}:")
-        results = []
-        for char in positionFollowers[position]:
-            followers = positionFollowers[position][char]
-            if followers:
-                mostCommonFollower, occurrences = max(followers.items(), key=lambda item: item[1])
-                percentage = (occurrences / totalFollowers[position][char]) * 100
-                results.append((char, mostCommonFollower, occurrences, percentage))
+    run_plugins(filePath, [PositionNextCharacterPlugin(maxLength)])[0].report()
+
+def merge_main(argv):
+    parser = argparse.ArgumentParser(prog="passlab.py merge", description="Merge passlab state files from separate runs into one")
+    parser.add_argument("states", nargs='+', help="State files to merge")
+    parser.add_argument("-o", "--output", required=True, help="Path of the merged state file")
+    args = parser.parse_args(argv)
+    
+    analyzer = PasswordAnalyzer(None)
+    analyzer.load_states(args.states)
+    analyzer.save_state(args.output)
+
+# name -> (analyzer attribute, denominator attribute for the share)
+SERVE_COUNTERS = {
+    'lengths': ('length_distribution', 'valid_passwords'),
+    'patterns': ('patterns', 'valid_passwords'),
+    'complexity': ('complexity_distribution', 'valid_passwords'),
+    'characters': ('character_overall_counter', 'total_chars'),
+    'trigrams': ('trigram_frequency', 'valid_passwords'),
+    'suffixes': ('number_suffix_patterns', 'valid_passwords'),
+    'keyboard': ('keyboard_sequences', 'valid_passwords'),
+    'repetitive': ('repetitive_sequences', 'valid_passwords'),
+    'capitalization': ('capitalization_patterns', 'valid_passwords'),
+    'words': ('common_words', 'valid_passwords'),
+    'boundaries': ('word_boundaries', 'valid_passwords'),
+    'dates': ('date_patterns', 'valid_passwords'),
+}
+
+class SortedView:
+    def __init__(self, counts, total=None):
+        # keys are strings so they match what arrives in JSON queries
+        self.counts = {str(key): count for key, count in counts.items()}
+        self.ranked = sorted(self.counts.items(), key=lambda item: -item[1])
+        self.total = sum(self.counts.values()) if total is None else total
+    
+    def top(self, limit=10, offset=0):
+        return [self.entry(key, count) for key, count in self.ranked[offset:offset + limit]]
+    
+    def entry(self, key, count):
+        return {'key': key, 'count': count, 'share': count / self.total if self.total else 0.0}
+    
+    def lookup(self, key):
+        return self.entry(key, self.counts.get(key, 0))
+
+class StateIndex:
+    # Sorted views of a loaded analyzer, built once per (re)load so every
+    # query is a dict lookup or a list slice. A reload builds a new index
+    # and swaps it in, so queries never see a half-built one
+    def __init__(self, analyzer):
+        self.summary = {
+            'sources': analyzer.sources, 'total_passwords': analyzer.total_passwords,
+            'valid_passwords': analyzer.valid_passwords, 'filtered_passwords': analyzer.filtered_passwords,
+            'unique_passwords': analyzer.unique_valid or None, 'settings': analyzer.settings()
+        }
+        self.counters = {}
+        for name, (attribute, denominator) in SERVE_COUNTERS.items():
+            counter = getattr(analyzer, attribute)
+            if counter:
+                self.counters[name] = SortedView(counter, getattr(analyzer, denominator))
+        # derivations are served as aggregates, never as the tracked passwords
+        appended = appended_counts(find_derivations(analyzer.derivation_bases))
+        if appended:
+            self.counters['appended'] = SortedView(appended, analyzer.valid_passwords)
+        self.positions = {position + 1: SortedView(counter) for position, counter in analyzer.position_character_counters.items()}
+        self.followers = {(None, char): SortedView(counter) for char, counter in analyzer.followers.items()}
+        for position, followers in analyzer.position_followers.items():
+            for char, counter in followers.items():
+                self.followers[(position + 1, char)] = SortedView(counter)
+    
+    def answer(self, request):
+        query = request.get('query')
+        limit = int(request.get('limit', 10))
+        offset = int(request.get('offset', 0))
+        if query == 'summary':
+            return self.summary
+        if query == 'counters':
+            return {'counters': sorted(self.counters), 'positions': len(self.positions)}
+        if query in ('top', 'count'):
+            view = self.counters.get(request.get('counter'))
+            if view is None:
+                raise KeyError(f"unknown or empty counter: {request.get('counter')}")
+        elif query == 'position':
+            view = self.positions.get(int(request.get('position', 0)))
+            if view is None:
+                raise KeyError(f"no characters at position {request.get('position')}")
+        elif query == 'followers':
+            position = request.get('position')
+            view = self.followers.get((int(position) if position is not None else None, request.get('char')))
+            if view is None:
+                raise KeyError(f"no followers for {request.get('char')!r} at position {position}")
+        else:
+            raise KeyError(f"unknown query: {query}")
+        if 'key' in request:
+            return view.lookup(str(request['key']))
+        return {'total': view.total, 'entries': view.top(limit, offset)}
+
+class QueryServer:
+    def __init__(self, states):
+        self.states = states
+        self.index = None
+        self.lock = threading.Lock()
+        self.mtimes = None
+    
+    def reload(self, states=None):
+        # load_states reports errors with sys.exit; a failed reload keeps the old index
+        with self.lock:
+            states = states or self.states
+            analyzer = PasswordAnalyzer(None)
+            try:
+                analyzer.load_states(states)
+            except SystemExit:
+                raise RuntimeError(f"could not load {', '.join(states)}; keeping the previous state")
+            self.index = StateIndex(analyzer)
+            self.states = states
+            self.mtimes = self._mtimes()
+            return {'reloaded': states, 'total_passwords': analyzer.total_passwords}
+    
+    def _mtimes(self):
+        return [os.path.getmtime(path) if os.path.exists(path) else None for path in self.states]
+    
+    def watch(self, interval):
+        while True:
+            time.sleep(interval)
+            if self._mtimes() != self.mtimes:
+                try:
+                    self.reload()
+                except RuntimeError as e:
+                    print(f"{Colors.YELLOW}Warning: {e}{Colors.RESET}")
+    
+    def handle(self, request):
+        try:
+            if not isinstance(request, dict):
+                raise ValueError("a query must be a JSON object")
+            if request.get('query') == 'reload':
+                return self.reload(request.get('states'))
+            return self.index.answer(request)
+        except (KeyError, ValueError, TypeError, RuntimeError) as e:
+            return {'error': str(e.args[0]) if e.args else str(e)}
+
+def _socket_handler(server):
+    class Handler(socketserver.StreamRequestHandler):
+        # one JSON request per line, answered with one JSON line, so clients
+        # can keep the connection open for many queries
+        def handle(self):
+            for line in self.rfile:
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                except ValueError as e:
+                    response = {'error': f"invalid JSON: {e}"}
+                else:
+                    response = server.handle(request)
+                self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+                self.wfile.flush()
+    return Handler
+
+def _http_handler(server):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        
+        def _respond(self, response):
+            body = json.dumps(response).encode('utf-8')
+            self.send_response(400 if 'error' in response else 200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def do_GET(self):
+            # GET /top?counter=patterns&limit=5 is the same as the JSON query
+            url = urllib.parse.urlsplit(self.path)
+            request = dict(urllib.parse.parse_qsl(url.query), query=url.path.strip('/') or 'summary')
+            self._respond(server.handle(request))
         
-        sortedResults = sorted(results, key=lambda x: x[2], reverse=True)
-        for char, mostCommonFollower, occurrences, percentage in sortedResults:
-            print(f"  Character '{char}' most often followed by '{mostCommonFollower}' (Occurrences: {occurrences}, {percentage:.2f}%)")
+        def do_POST(self):
+            try:
+                request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+            except ValueError as e:
+                self._respond({'error': f"invalid JSON: {e}"})
+                return
+            self._respond(server.handle(request))
+        
+        def log_message(self, format, *args):
+            pass
+    return Handler
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(prog="passlab.py serve",
+                                     description="Answer JSON queries about saved analysis states over a Unix socket or localhost HTTP")
+    parser.add_argument("states", nargs='+', help="State files to load (as with --load-state)")
+    parser.add_argument("--socket", metavar="PATH", help="Listen on a Unix socket (one JSON query per line)")
+    parser.add_argument("--port", type=int, default=8765, help="HTTP port on --host when no --socket is given (default: 8765)")
+    parser.add_argument("--host", default='127.0.0.1', help="HTTP address (default: 127.0.0.1)")
+    parser.add_argument("--watch", type=float, default=0, metavar="SECONDS",
+                        help="Reload when a state file changes, checking every SECONDS")
+    args = parser.parse_args(argv)
+    
+    server = QueryServer(args.states)
+    try:
+        server.reload()
+    except RuntimeError as e:
+        print(f"{Colors.RED}Error: {e}{Colors.RESET}")
+        sys.exit(1)
+    
+    # SIGTERM unwinds like Ctrl+C so the socket file is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    if hasattr(signal, 'SIGHUP'):
+        signal.signal(signal.SIGHUP, lambda *_: threading.Thread(target=server.handle, args=({'query': 'reload'},), daemon=True).start())
+    if args.watch:
+        threading.Thread(target=server.watch, args=(args.watch,), daemon=True).start()
+    
+    try:
+        if args.socket:
+            if not hasattr(socketserver, 'ThreadingUnixStreamServer'):
+                print(f"{Colors.RED}Error: Unix sockets are not available on this platform; use --port.{Colors.RESET}")
+                sys.exit(1)
+            if os.path.exists(args.socket):
+                os.remove(args.socket)
+            listener = socketserver.ThreadingUnixStreamServer(args.socket, _socket_handler(server))
+            where = args.socket
+        else:
+            listener = http.server.ThreadingHTTPServer((args.host, args.port), _http_handler(server))
+            where = f"http://{args.host}:{listener.server_address[1]}/"
+    except OSError as e:
+        print(f"{Colors.RED}Error: cannot listen: {e}{Colors.RESET}")
+        sys.exit(1)
+    
+    listener.daemon_threads = True
+    print(f"{Colors.GREEN}Serving queries on {where} (Ctrl+C to stop){Colors.RESET}")
+    try:
+        listener.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.server_close()
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+def limit_batches(batches, limit):
+    # cuts a (unit, level, batch, done) stream after `limit` candidates,
+    # keeping done right for the unit the cut falls in
+    for unit, level, batch, done in batches:
+        if len(batch) >= limit:
+            yield unit, level, batch[:limit], done - len(batch) + limit
+            return
+        limit -= len(batch)
+        yield unit, level, batch, done
+
+def merge_batches(batches, size=GENERATE_BATCH_SIZE):
+    # joins small per-unit batches into output-sized ones; the position of
+    # a merged batch is that of its last piece
+    merged = []
+    for unit, level, batch, done in batches:
+        merged += batch
+        if len(merged) >= size:
+            yield unit, level, merged, done
+            merged = []
+    if merged:
+        yield unit, level, merged, done
+
+def read_checkpoint(path):
+    with open(path) as f:
+        return json.load(f)
+
+def write_checkpoint(path, checkpoint):
+    # written beside the target and renamed, so a crash never leaves half a file
+    temp = f"{path}.tmp"
+    with open(temp, 'w') as f:
+        json.dump(checkpoint, f, indent=2)
+    os.replace(temp, path)
+
+def generate_main(argv):
+    parser = argparse.ArgumentParser(prog="passlab.py generate",
+                                     description="Stream password candidates in descending probability of a --markov model or --pcfg grammar")
+    parser.add_argument("model", nargs='?', help="Markov model file written with --markov")
+    parser.add_argument("--grammar", metavar="FILE", help="Generate from a PCFG grammar written with --pcfg instead")
+    parser.add_argument("-o", "--output", help="Write candidates to FILE instead of standard output (appended when resuming)")
+    parser.add_argument("--min-length", type=int, default=1, help="Shortest candidate length")
+    parser.add_argument("--max-length", type=int, help="Longest candidate length (default: longest in the model)")
+    parser.add_argument("--limit", type=int, metavar="N", help="Stop after N candidates")
+    parser.add_argument("--max-level", type=int, metavar="N", help="Stop after level sum N")
+    parser.add_argument("--level-bits", type=float, default=1.0, metavar="BITS",
+                        help="Width of a probability level in bits; smaller is finer ordering but more levels (default: 1). "
+                             "Grammar guesses are already in exact order; their level only serves --max-level")
+    parser.add_argument("--partition", default='1/1', metavar="K/N",
+                        help="Generate only partition K of N disjoint partitions of the keyspace (default: 1/1)")
+    parser.add_argument("--checkpoint", metavar="FILE", help="Record progress in FILE and resume from it when it exists")
+    parser.add_argument("--checkpoint-interval", type=float, default=30, metavar="SECONDS",
+                        help="Seconds between checkpoint updates (default: 30)")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Report progress on standard error")
+    args = parser.parse_args(argv)
+    
+    if bool(args.model) == bool(args.grammar):
+        parser.error("give either a Markov model or --grammar")
+    try:
+        partition, partitions = (int(part) for part in args.partition.split('/'))
+    except ValueError:
+        parser.error("--partition must look like K/N, e.g. 2/4")
+    if not 1 <= partition <= partitions:
+        parser.error("--partition K/N needs 1 <= K <= N")
+    if args.level_bits <= 0:
+        parser.error("--level-bits must be positive")
+    
+    source = args.model or args.grammar
+    try:
+        if args.grammar:
+            generator = PcfgGenerator(read_grammar_file(args.grammar), args.level_bits, args.min_length, args.max_length)
+        else:
+            generator = LevelGenerator(MarkovModel.load(args.model), args.level_bits, args.min_length, args.max_length)
+    except (OSError, ValueError, EOFError, zlib.error) as e:
+        print(f"{Colors.RED}Error loading {'grammar' if args.grammar else 'Markov model'}: {e}{Colors.RESET}", file=sys.stderr)
+        sys.exit(1)
+    
+    settings = {
+        'model': os.path.abspath(source), 'model_size': os.path.getsize(source), 'grammar': bool(args.grammar),
+        'min_length': args.min_length, 'max_length': args.max_length, 'level_bits': args.level_bits,
+        'partition': [partition, partitions]
+    }
+    checkpoint = {'settings': settings, 'unit': 0, 'done': 0, 'level': 0, 'emitted': 0, 'finished': False}
+    if args.checkpoint and os.path.exists(args.checkpoint):
+        try:
+            saved = read_checkpoint(args.checkpoint)
+        except (OSError, ValueError) as e:
+            print(f"{Colors.RED}Error reading checkpoint: {e}{Colors.RESET}", file=sys.stderr)
+            sys.exit(1)
+        if saved['settings'] != settings:
+            print(f"{Colors.RED}Error: '{args.checkpoint}' was written for a different model or grammar, length range, "
+                  f"level width or partition.{Colors.RESET}", file=sys.stderr)
+            sys.exit(1)
+        if saved['finished']:
+            print(f"{Colors.YELLOW}Checkpoint '{args.checkpoint}' is already finished.{Colors.RESET}", file=sys.stderr)
+            return
+        checkpoint = saved
+        if args.verbose:
+            print(f"Resuming at level {checkpoint['level']} after {checkpoint['emitted']} candidates", file=sys.stderr)
+    
+    stopping = []
+    signal.signal(signal.SIGTERM, lambda *_: stopping.append(True))
+    signal.signal(signal.SIGINT, lambda *_: stopping.append(True))
+    
+    try:
+        out = open(args.output, 'ab' if checkpoint['emitted'] else 'wb') if args.output else sys.stdout.buffer
+    except OSError as e:
+        print(f"{Colors.RED}Error opening output: {e}{Colors.RESET}", file=sys.stderr)
+        sys.exit(1)
+    
+    emitted = checkpoint['emitted']
+    progress = {}
+    finished = False
+    last_saved = time.monotonic()
+    batches = generator.batches(partition - 1, partitions, checkpoint['unit'], checkpoint['done'], args.max_level)
+    if args.limit:
+        batches = limit_batches(batches, max(0, args.limit - emitted))
+    try:
+        for unit, level, batch, done in merge_batches(batches):
+            if stopping:
+                break
+            out.write(('\n'.join(batch) + '\n').encode('utf-8'))
+            emitted += len(batch)
+            progress = {'unit': unit, 'done': done, 'level': level, 'emitted': emitted}
+            if args.checkpoint and time.monotonic() - last_saved >= args.checkpoint_interval:
+                # only flushed candidates may count as done
+                out.flush()
+                checkpoint.update(progress)
+                write_checkpoint(args.checkpoint, checkpoint)
+                last_saved = time.monotonic()
+                if args.verbose:
+                    print(f"Level {level}: {emitted} candidates", file=sys.stderr)
+        else:
+            finished = not (args.limit and emitted >= args.limit)
+        out.flush()
+        checkpoint.update(progress, finished=finished)
+    except BrokenPipeError:
+        # the reader went away; the checkpoint keeps the last flushed position
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+    finally:
+        if args.checkpoint:
+            write_checkpoint(args.checkpoint, checkpoint)
+        if args.output:
+            out.close()
+    
+    if args.verbose:
+        print(f"{'Finished' if checkpoint['finished'] else 'Stopped'} after {checkpoint['emitted']} candidates "
+              f"at level {checkpoint['level']}", file=sys.stderr)
 
 def main():
-    parser = argparse.ArgumentParser(description="Unified Password Analyzer - Comprehensive password analysis tool")
+    if len(sys.argv) > 1 and sys.argv[1] == 'merge':
+        merge_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'serve':
+        serve_main(sys.argv[2:])
+        return
+    if len(sys.argv) > 1 and sys.argv[1] == 'generate':
+        generate_main(sys.argv[2:])
+        return
+    
+    parser = argparse.ArgumentParser(description="Unified Password Analyzer - Comprehensive password analysis tool",
+                                     epilog="Use 'passlab.py merge -o OUT STATE...' to combine saved states and "
+                                            "'passlab.py serve STATE...' to answer queries about them; "
+                                            "'passlab.py generate MODEL' streams candidates from a --markov model "
+                                            "(or from a --pcfg grammar with --grammar).")
     
-    parser.add_argument("file", help="Password file to analyze")
+    parser.add_argument("file", nargs='?', help="Password file to analyze ('-' reads standard input)")
+    parser.add_argument("-i", "--input", help="Password file to analyze, same as the positional argument ('-' reads standard input)")
+    parser.add_argument("--input-format", choices=INPUT_FORMATS, default='plain',
+                        help="plain: one password per line; uniq-c: 'uniq -c' output; counted: 'count:password'; potfile: hashcat/John 'hash:plain'")
     parser.add_argument("-o", "--output", help="Directory to save analysis results", default=None)
     parser.add_argument("-v", "--verbose", action="store_true", help="Enable verbose output")
     
@@ -915,12 +4130,66 @@ def main():
     parser.add_argument("--position", action="store_true", help="Show position-specific analysis")
     parser.add_argument("--followers", action="store_true", help="Show character follower analysis")
     parser.add_argument("--enhanced", action="store_true", help="Enable enhanced pattern detection")
+    parser.add_argument("--entropy", action="store_true", help="Show entropy percentiles and entropy by length")
+    parser.add_argument("--entropy-samples", type=int, default=0, metavar="N", help="Keep a bounded sample of N example passwords for the entropy report")
     parser.add_argument("--classic", action="store_true", help="Show classic analysis from original scripts")
     parser.add_argument("--dictionary", help="Path to dictionary file for word detection")
+    parser.add_argument("--dictionary-cache", metavar="FILE", help="Cache the compiled dictionary automaton in FILE and reuse it on later runs")
+    parser.add_argument("--keyboard-layout", metavar="FILE", help="JSON file with extra keyboard layouts for walk detection")
+    parser.add_argument("--keyboard-min-walk", type=int, default=4, metavar="N", help="Minimum length of a reported keyboard walk")
+    parser.add_argument("--plugin", action="append", default=[], choices=sorted(ANALYSIS_PLUGINS), metavar="NAME",
+                        help=f"Also run a standalone-script analysis in the same pass (repeatable): {', '.join(sorted(ANALYSIS_PLUGINS))}")
     parser.add_argument("--all", action="store_true", help="Show all analysis types")
+    parser.add_argument("--engine", choices=['python', 'numpy'], default='python', help="Counting engine for positional and follower statistics")
+    parser.add_argument("--approx-memory", type=int, default=0, metavar="MB",
+                        help="Count patterns, sequences, suffixes, dates and trigrams approximately within about MB megabytes (top entries with error bounds)")
+    parser.add_argument("--dedup", action="store_true",
+                        help="Collapse duplicate passwords first and analyze each unique password once; reports add by-unique-password counts")
+    parser.add_argument("--dedup-memory", type=int, default=512, metavar="MB",
+                        help="Memory for the dedup stage before partial counts spill to temporary files (default: 512)")
+    parser.add_argument("--dedup-dir", metavar="DIR", help="Directory for dedup spill files (default: system temporary directory)")
+    parser.add_argument("--sample", type=float, default=0, metavar="RATE",
+                        help="Analyze a random fraction RATE (0-1) of the lines; percentages get confidence intervals")
+    parser.add_argument("--sample-size", type=int, default=0, metavar="N", help="Analyze a random sample of N lines")
+    parser.add_argument("--sample-method", choices=SAMPLE_METHODS,
+                        help="How --sample-size draws lines: seek reads only the lines at random byte offsets (default, plain files), "
+                             "reservoir reads the whole input, stratified keeps the length proportions")
+    parser.add_argument("--sample-seed", type=int, metavar="N", help="Seed for reproducible samples")
+    parser.add_argument("--workers", type=int, default=1, help="Number of processes used to analyze the file in parallel")
+    parser.add_argument("--hcmask", metavar="FILE", help="Write hashcat masks ranked by hits per keyspace, with charsets narrowed to observed characters")
+    parser.add_argument("--mask-coverage", type=float, default=0.9, metavar="FRACTION",
+                        help="Stop adding masks once they cover this share of the passwords (default: 0.9)")
+    parser.add_argument("--mask-keyspace", type=float, metavar="N", help="Maximum total keyspace of the masks, e.g. 1e13")
+    parser.add_argument("--markov", metavar="FILE",
+                        help="Write normalized per-position transition tables to a memory-mappable model file "
+                             "(per length too when run with --plugin markov-length)")
+    parser.add_argument("--hcstat2", metavar="FILE", help="Write the per-position transition counts as a hashcat .hcstat2 file")
+    parser.add_argument("--pcfg", metavar="FILE",
+                        help="Train a probabilistic context-free grammar (base structures, terminals, capitalization) "
+                             "in the same pass and write it to FILE for 'generate --grammar'")
+    parser.add_argument("--export-sqlite", metavar="DB",
+                        help="Add all counters to an SQLite database with one run per source file (re-exports replace the run)")
+    parser.add_argument("--profile", metavar="FILE",
+                        help="Write per-stage timings, throughput over time and counter memory to a JSON file")
+    parser.add_argument("--save-state", metavar="FILE", help="Save the collected counters to a binary state file")
+    parser.add_argument("--load-state", metavar="FILE", nargs='+', help="Render reports from saved state files instead of a password file")
     
     args = parser.parse_args()
     
+    args.file = args.input or args.file
+    if not args.file and not args.load_state:
+        parser.error("a password file or --load-state is required")
+    # decided before --pcfg adds its plugin, so the grammar export keeps the default reports
+    show_all = args.all or not any([args.summary, args.position, args.followers, args.enhanced, args.classic, args.entropy, args.plugin])
+    if args.pcfg and not args.load_state and 'pcfg' not in args.plugin:
+        args.plugin.append('pcfg')
+    if args.sample and not 0 < args.sample <= 1:
+        parser.error("--sample RATE must be between 0 and 1")
+    if args.sample and args.sample_size:
+        parser.error("--sample and --sample-size cannot be combined")
+    if args.sample_method and not args.sample_size:
+        parser.error("--sample-method requires --sample-size")
+    
     analyzer = PasswordAnalyzer(
         file_path=args.file,
         max_length=args.max_length,
@@ -930,17 +4199,41 @@ def main():
         pattern=args.pattern,
         verbose=args.verbose,
         dictionary=args.dictionary,
-        enhanced=args.enhanced or args.all
+        dictionary_cache=args.dictionary_cache,
+        keyboard_layout=args.keyboard_layout,
+        keyboard_min_walk=args.keyboard_min_walk,
+        engine=args.engine,
+        enhanced=args.enhanced or args.all,
+        workers=args.workers,
+        entropy_samples=args.entropy_samples,
+        plugins=args.plugin,
+        approx_memory=args.approx_memory,
+        input_format=args.input_format,
+        dedup=args.dedup,
+        dedup_memory=args.dedup_memory,
+        dedup_dir=args.dedup_dir,
+        sample_rate=args.sample,
+        sample_size=args.sample_size,
+        sample_method=args.sample_method,
+        sample_seed=args.sample_seed,
+        profile=bool(args.profile)
     )
     
-    analyzer.analyze()
+    if args.load_state:
+        analyzer.load_states(args.load_state)
+    else:
+        analyzer.analyze()
     
-    show_all = args.all or not any([args.summary, args.position, args.followers, args.enhanced, args.classic])
+    if args.save_state:
+        analyzer.save_state(args.save_state)
     
     if show_all or args.summary:
         analyzer.print_summary()
         analyzer.print_character_analysis()
     
+    if args.all or args.entropy:
+        analyzer.print_entropy_analysis()
+    
     if show_all or args.position:
         analyzer.print_position_analysis()
     
@@ -953,8 +4246,28 @@ def main():
     if show_all or args.classic:
         analyzer.print_classic_analysis()
     
+    analyzer.print_plugin_reports()
+    
     if args.output:
         analyzer.export_results()
+    
+    if args.hcmask:
+        analyzer.export_hcmask(args.hcmask, args.mask_coverage, args.mask_keyspace)
+    
+    if args.markov:
+        analyzer.export_markov(args.markov)
+    
+    if args.hcstat2:
+        analyzer.export_hcstat2(args.hcstat2)
+    
+    if args.pcfg:
+        analyzer.export_pcfg(args.pcfg)
+    
+    if args.export_sqlite:
+        analyzer.export_sqlite(args.export_sqlite)
+    
+    if args.profile:
+        analyzer.write_profile(args.profile)
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,55 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlab import PasswordAnalyzer, appended_counts, find_derivations
+
+CORPUS = (
+    ['poiu', 'poiuy'] + ['poiuyt'] * 3
+    + ['monkey'] * 5 + ['monkey1'] * 3 + ['monkey12'] * 2 + ['monkey123'] * 4
+    + ['qwerty'] * 2 + ['qwerty!']
+)
+
+
+class DerivationTest(unittest.TestCase):
+    def analyze(self, lines):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False) as f:
+            f.write('\n'.join(lines) + '\n')
+        try:
+            analyzer = PasswordAnalyzer(f.name, enhanced=True)
+            with contextlib.redirect_stdout(io.StringIO()):
+                analyzer.analyze()
+        finally:
+            os.unlink(f.name)
+        return analyzer
+
+    def test_each_derived_password_has_one_base(self):
+        analyzer = self.analyze(CORPUS)
+        derivations = find_derivations(analyzer.derivation_bases)
+        self.assertEqual(sorted((base, derived, count) for base, derived, _, count in derivations), [
+            ('monkey', 'monkey1', 3),
+            ('monkey1', 'monkey12', 2),
+            ('monkey12', 'monkey123', 4),
+            ('qwerty', 'qwerty!', 1),
+        ])
+
+    def test_appended_totals_do_not_overlap(self):
+        analyzer = self.analyze(CORPUS)
+        appended = appended_counts(find_derivations(analyzer.derivation_bases))
+        self.assertEqual(appended, {'1': 3, '2': 2, '3': 4, '!': 1})
+        self.assertLessEqual(sum(appended.values()), analyzer.valid_passwords)
+
+    def test_rare_bases_are_skipped(self):
+        analyzer = self.analyze(CORPUS)
+        bases = {base for base, _, _, _ in find_derivations(analyzer.derivation_bases)}
+        self.assertNotIn('poiu', bases)
+        self.assertNotIn('poiuy', bases)
+
+
+if __name__ == '__main__':
+    unittest.main()
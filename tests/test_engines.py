@@ -0,0 +1,47 @@
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passlab import PasswordAnalyzer, np
+
+# every character below appears equally often at its position, so the
+# reports only agree if both engines break ties the same way; the non-ASCII
+# lines take the engine's Python path
+CORPUS = ['zb1!', 'ya2@', 'xc3#', 'wd4$', 'Éa2@', 'zbÉ!', 'ñx', 'b4', 'a3', 'Zz9', 'Aa9']
+COUNTED = ['3:zb1!', '1:ya2@', '2:xc3#', '3:wd4$', '1:Éa2@', '2:ñx', '3:b4', '3:a3']
+
+
+@unittest.skipIf(np is None, "NumPy is not installed")
+class EngineTest(unittest.TestCase):
+    def report(self, lines, engine, input_format='plain'):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt', delete=False, encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        try:
+            analyzer = PasswordAnalyzer(f.name, engine=engine, input_format=input_format)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                analyzer.analyze()
+                analyzer.print_position_analysis()
+                analyzer.print_follower_analysis()
+                analyzer.print_classic_analysis()
+        finally:
+            os.unlink(f.name)
+        state = analyzer.get_state()
+        orders = {name: repr(state[name]) for name in ('position_character_counters', 'position_type_counters',
+                                                       'followers', 'position_followers')}
+        return '\n'.join(line for line in output.getvalue().splitlines() if 'completed in' not in line), orders
+
+    def test_reports_match_python_engine(self):
+        self.assertEqual(self.report(CORPUS, 'numpy'), self.report(CORPUS, 'python'))
+
+    def test_weighted_reports_match_python_engine(self):
+        self.assertEqual(self.report(COUNTED, 'numpy', 'counted'), self.report(COUNTED, 'python', 'counted'))
+
+
+if __name__ == '__main__':
+    unittest.main()